@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# --- Serial-path benchmark against simulated boards (no hardware needed) ---
+# Runs each scenario on every FakeBoard at once, one RelayBoard and thread per board:
+#   frames  single-coil frames queued back to back: the frame rate the pacing allows
+#   bulk    alternating 16-relay patterns: one multi-coil frame plus its ack per step
+#   toggle  one relay at a time, --interval apart: from queueing the toggle until the board switched
+# and splits the busy time into frame-gap sleeps, writes and reply waits (see metrics.py).
+# Writes to a pty return at once, so with --baud the line time shows up as the simulated
+# board taking each frame in, and in the reply waits, rather than in the writes.
+# --json prints the results, for comparing protocol or scheduling changes between runs.
+#   python3 benchmark.py --boards 2 --frames 200 --toggles 100 --min-gap 0.01
+import argparse
+import json
+import sys
+import threading
+import time
+import fakeboard
+import protocol
+from metrics import percentile
+import relayboard
+
+TOGGLE_TIMEOUT = 2.0 # Longest wait for the simulated board to show a toggle
+CATCH_UP_TIMEOUT = 30.0 # Longest wait for a simulated board to take in the frames already written
+
+
+def bench_frames(board, fake, count):
+    # Raw frames, not board.apply(): nothing to diff or coalesce, so every one is written.
+    frames = protocol.relay_table(board.address)
+    for n in range(count):
+        board.submit(frames[(n // protocol.RELAY_COUNT + 1) % 2][n % protocol.RELAY_COUNT], block=True)
+
+
+def bench_bulk(board, fake, count):
+    for n in range(count):
+        board.apply(0x5555 if n % 2 else 0xAAAA, block=True)
+
+
+def bench_toggle(board, fake, count, interval):
+    latencies = []
+    for n in range(count):
+        relay = n % protocol.RELAY_COUNT
+        on = not board.state.target_is_on(relay)
+        started = time.perf_counter()
+        board.set_relay(relay, on, block=True)
+        if not fake.wait_until(lambda b: bool(b.mask >> relay & 1) == on, TOGGLE_TIMEOUT):
+            raise RuntimeError(f"relay {relay + 1} on {board.port} did not switch")
+        latencies.append(time.perf_counter() - started)
+        board.wait_idle()
+        time.sleep(interval)
+    return latencies
+
+
+def run_scenario(pairs, bench, *args):
+    # The same scenario on every board at once. Returns its results with the wall time, the
+    # frames the boards received and where the workers spent their time.
+    before = [board.metrics_snapshot() for board, _ in pairs]
+    frames_before = [fake.frames for _, fake in pairs]
+    results = [None] * len(pairs)
+    def run(i, board, fake):
+        results[i] = bench(board, fake, *args)
+        board.wait_idle()
+        # A pty takes writes at once, so the line time is spent on the board's side: wait for it
+        # to take in (and answer) everything written.
+        written = board.metrics_snapshot()['frames'] - before[i]['frames']
+        fake.wait_until(lambda b: b.frames - frames_before[i] >= written and b.idle, CATCH_UP_TIMEOUT)
+    threads = [threading.Thread(target=run, args=(i, board, fake)) for i, (board, fake) in enumerate(pairs)]
+    started = time.perf_counter()
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    elapsed = time.perf_counter() - started
+    after = [board.metrics_snapshot() for board, _ in pairs]
+    spent = {'pacing': sum(a['pacing_seconds'] - b['pacing_seconds'] for b, a in zip(before, after))}
+    for name in ('write', 'reply'):
+        spent[name] = sum(a['latency'][name]['sum'] - b['latency'][name]['sum'] for b, a in zip(before, after))
+    return {
+        'seconds': elapsed,
+        'frames': sum(fake.frames for _, fake in pairs) - sum(frames_before),
+        'errors': sum(1 for board, _ in pairs for _, error in board.completed() if error),
+        'spent': spent,
+        'results': results,
+    }
+
+
+def describe(name, outcome, boards):
+    busy = outcome['seconds'] * boards
+    spent = ', '.join(f"{what} {seconds / busy:.0%}" for what, seconds in outcome['spent'].items())
+    text = f"{name:7} {outcome['frames']} frames in {outcome['seconds']:.2f} s = {outcome['frames'] / outcome['seconds']:.1f} frames/s"
+    if boards > 1: text += f" ({outcome['frames'] / outcome['seconds'] / boards:.1f} per board)"
+    text += f"; worker time: {spent}"
+    if outcome['errors']: text += f"; {outcome['errors']} errors"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the serial path against simulated relay boards.")
+    parser.add_argument('--boards', type=int, default=1)
+    parser.add_argument('--frames', type=int, default=200, help="single-coil frames per board")
+    parser.add_argument('--bulk', type=int, default=50, help="16-relay patterns per board")
+    parser.add_argument('--toggles', type=int, default=50, help="timed single-relay toggles per board")
+    parser.add_argument('--interval', type=float, default=0.05, help="idle time between timed toggles, in seconds")
+    parser.add_argument('--baud', type=int, default=relayboard.BAUD_RATE, help="simulated line rate, 0 for none")
+    parser.add_argument('--min-gap', type=float, default=relayboard.MIN_FRAME_GAP, help="frame gap to test (default: %(default)s)")
+    parser.add_argument('--coalesce-window', type=float, default=relayboard.COALESCE_WINDOW)
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    opts = parser.parse_args(argv)
+    fakes = [fakeboard.FakeBoard(baud=opts.baud or None) for _ in range(opts.boards)]
+    pairs = [(relayboard.RelayBoard(fake.device, min_gap=opts.min_gap, coalesce_window=opts.coalesce_window).open(), fake) for fake in fakes]
+    try:
+        outcomes = {
+            'frames': run_scenario(pairs, bench_frames, opts.frames),
+            'bulk': run_scenario(pairs, bench_bulk, opts.bulk),
+            'toggle': run_scenario(pairs, bench_toggle, opts.toggles, opts.interval),
+        }
+    finally:
+        for board, fake in pairs:
+            board.close(drain=False)
+            fake.close()
+    latencies = sorted(l for board_latencies in outcomes['toggle'].pop('results') for l in board_latencies)
+    toggle = {f'p{int(p * 100)}_ms': percentile(latencies, p) * 1000 for p in (0.5, 0.9, 0.99)}
+    toggle['max_ms'] = latencies[-1] * 1000 if latencies else 0.0
+    if opts.json:
+        for outcome in outcomes.values(): outcome.pop('results', None)
+        print(json.dumps({'settings': vars(opts), 'scenarios': outcomes, 'toggle_latency': toggle}, indent=2))
+        return 0
+    print(f"{opts.boards} board(s), {opts.baud or 'no'} baud line time, min_frame_gap {opts.min_gap}, coalesce_window {opts.coalesce_window}")
+    for name in ('frames', 'bulk'):
+        print(describe(name, outcomes[name], opts.boards))
+    print(f"toggle  {len(latencies)} toggles, queued to switched: p50 {toggle['p50_ms']:.1f} ms, "
+          f"p90 {toggle['p90_ms']:.1f} ms, p99 {toggle['p99_ms']:.1f} ms, max {toggle['max_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# --- Cached serial port index keyed by stable board identity ---
+# tty names (/dev/ttyUSB0, COM3) are handed out in plug order and change across reboots,
+# so boards are identified by USB serial number when they have one (the CH340 usually
+# does not) or by their physical USB path (bus-port chain), which is stable per socket.
+# The index is filled by one port scan and only rescanned on refresh() (hotplug events).
+# Sections from older configs named after a tty are renamed to the identity of the board
+# found on that tty by migrate_sections(), so their labels stop following the tty number.
+import os
+import relayboard
+
+
+def port_identity(port):
+    if port.serial_number and port.vid is not None:
+        return f"usb-serial:{port.vid:04X}:{port.pid:04X}:{port.serial_number}"
+    if port.location:
+        return f"usb-path:{port.location}"
+    return port.device
+
+
+def is_relay_board(port):
+    return relayboard.CH340_HWID in port.hwid.upper()
+
+
+def rename_section(config_parser, old, new):
+    # configparser cannot rename; rebuild every section so the order is kept.
+    sections = [(new if s == old else s, dict(config_parser.items(s, raw=True))) for s in config_parser.sections()]
+    for section in config_parser.sections(): config_parser.remove_section(section)
+    for section, items in sections: config_parser[section] = items
+
+
+def migrate_sections(config_parser, index):
+    # Renames tty-named sections to the stable identity of the relay board now on that tty.
+    # Returns {old: new}; the caller saves the config when it is not empty.
+    renamed = {}
+    for port in index.boards():
+        identity = port_identity(port)
+        if identity == port.device or config_parser.has_section(identity) or not config_parser.has_section(port.device): continue
+        rename_section(config_parser, port.device, identity)
+        renamed[port.device] = identity
+    return renamed
+
+
+class DeviceIndex:
+    def __init__(self, list_ports=relayboard.list_ports):
+        self.list_ports = list_ports
+        self.by_identity = {}
+        self.by_device = {}
+        self.scanned = False
+    def refresh(self):
+        ports = self.list_ports()
+        self.by_identity = {port_identity(p): p for p in ports}
+        self.by_device = {p.device: p for p in ports}
+        self.scanned = True
+        return self
+    def ensure_scanned(self):
+        if not self.scanned: self.refresh()
+        return self
+    def devices(self):
+        return set(self.by_device)
+    def boards(self):
+        return [p for p in self.by_device.values() if is_relay_board(p)]
+    def resolve(self, section):
+        # Config section -> current device node, or None if that board is not plugged in.
+        # Sections named after a device path are from older configs and resolve to themselves,
+        # as do paths the scan does not list, such as /dev/serial/by-path links or a test pty.
+        port = self.by_identity.get(section) or self.by_device.get(section)
+        if port: return port.device
+        return section if os.path.isabs(section) and os.path.exists(section) else None
+    def section_for(self, port, sections):
+        # The section a detected port is configured under, or the key a new one should use.
+        identity = port_identity(port)
+        if identity not in sections and port.device in sections: return port.device
+        return identity
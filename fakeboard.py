@@ -0,0 +1,132 @@
+# --- Simulated CH340 relay board on a pseudo-terminal, for testing without hardware ---
+# FakeBoard opens a pty pair and answers on the master side like the real board:
+# single-coil writes (05) are applied and echoed, multi-coil writes (0F) are applied and
+# acknowledged, and status queries (01) are answered with the relay mask. The slave
+# path (fake.device) is opened like any serial port, e.g. relayboard.RelayBoard(fake.device).
+# With baud set, each frame takes effect only after its own line time and replies are
+# delayed by theirs, to mimic a 9600 baud link (a pty itself has no line rate). Like the
+# UART, it sends replies while the next frame comes in. wait_until() lets a benchmark
+# see the moment a frame took effect. Linux/macOS only.
+import os
+import queue
+import select
+import threading
+import time
+import protocol
+
+LINE_BITS_PER_BYTE = 10 # 8N1: start + 8 data + stop
+
+
+class FakeBoard:
+    def __init__(self, address=protocol.DEFAULT_ADDRESS, baud=None, bulk_supported=True, status_supported=True):
+        self.address = address
+        self.baud = baud
+        self.bulk_supported = bulk_supported
+        self.status_supported = status_supported
+        self.mask = 0
+        self.frames = 0
+        self.bad_frames = 0
+        self.busy = False # True while a frame is being taken in
+        self.replies_pending = 0
+        self.send_at = 0.0 # When the last queued reply will have left
+        self.outbox = queue.SimpleQueue()
+        self.master, self.slave = os.openpty()
+        self.device = os.ttyname(self.slave)
+        self.updated = threading.Condition()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"fakeboard-{self.device}", daemon=True)
+        self.thread.start()
+        self.sender = threading.Thread(target=self.send, name=f"fakeboard-tx-{self.device}", daemon=True)
+        self.sender.start()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+    def wait_until(self, predicate, timeout=None):
+        # Blocks until predicate(self) holds after a frame, e.g. lambda board: board.mask & 1.
+        with self.updated:
+            return self.updated.wait_for(lambda: predicate(self), timeout)
+    @property
+    def idle(self):
+        return not self.busy and not self.replies_pending
+    def power_cycle(self):
+        # What a real board does when it loses 12 V: every relay drops out.
+        self.mask = 0
+    def run(self):
+        buffer = b''
+        while not self.stopped.is_set():
+            if not select.select([self.master], [], [], 0.1)[0]: continue
+            try:
+                buffer += os.read(self.master, 4096)
+            except OSError:
+                break
+            while protocol.FRAME_END in buffer:
+                line, buffer = buffer.split(protocol.FRAME_END, 1)
+                frame = line + protocol.FRAME_END
+                self.busy = True
+                if self.baud: time.sleep(len(frame) * LINE_BITS_PER_BYTE / self.baud)
+                self.handle(frame)
+                with self.updated:
+                    self.busy = False
+                    self.updated.notify_all()
+    def handle(self, raw):
+        try:
+            address, function, payload = protocol.decode_frame(raw)
+        except protocol.ProtocolError:
+            self.bad_frames += 1
+            return
+        if address != self.address: return
+        self.frames += 1
+        if function == protocol.FUNC_WRITE_COIL and len(payload) == 4:
+            relay, value = int.from_bytes(payload[:2], 'big'), int.from_bytes(payload[2:], 'big')
+            if relay < protocol.RELAY_COUNT:
+                self.mask = self.mask | 1 << relay if value == protocol.COIL_ON else self.mask & ~(1 << relay)
+            self.reply(raw)
+        elif function == protocol.FUNC_WRITE_COILS and self.bulk_supported and len(payload) >= 5:
+            start, count = int.from_bytes(payload[:2], 'big'), int.from_bytes(payload[2:4], 'big')
+            bits = (1 << count) - 1
+            self.mask = (self.mask & ~(bits << start) | (int.from_bytes(payload[5:], 'little') & bits) << start) & ((1 << protocol.RELAY_COUNT) - 1)
+            self.reply(protocol.encode_frame(self.address, function, payload[:4]))
+        elif function == protocol.FUNC_READ_COILS and self.status_supported:
+            data = self.mask.to_bytes(2, 'little')
+            self.reply(protocol.encode_frame(self.address, function, bytes((len(data),)) + data))
+    def reply(self, frame):
+        # Queued for the sender thread, due once the replies before it and its own line time have passed.
+        with self.updated:
+            self.replies_pending += 1
+            self.updated.notify_all() # The frame has taken effect; the reply follows
+        line_time = len(frame) * LINE_BITS_PER_BYTE / self.baud if self.baud else 0.0
+        self.send_at = max(self.send_at, time.monotonic()) + line_time
+        self.outbox.put((self.send_at, frame))
+    def send(self):
+        while (reply := self.outbox.get()) is not None:
+            send_at, frame = reply
+            wait = send_at - time.monotonic()
+            if wait > 0: time.sleep(wait)
+            try:
+                os.write(self.master, frame)
+            except OSError:
+                pass
+            with self.updated:
+                self.replies_pending -= 1
+                self.updated.notify_all()
+    def close(self):
+        self.stopped.set()
+        self.thread.join(1)
+        self.outbox.put(None)
+        self.sender.join(1)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    board = FakeBoard(baud=9600)
+    print(f"Fake relay board on {board.device} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        board.close()
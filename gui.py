@@ -1,153 +1,462 @@
+import time
+STARTED = time.perf_counter() # Reference point for --profile-startup
 import tkinter as tk
-from tkinter import messagebox, simpledialog, Toplevel, Listbox, Frame, Label, Button, Entry, Canvas
+from tkinter import filedialog, messagebox, simpledialog, Toplevel, Listbox, Frame, Label, Button, Entry, Canvas
 from functools import partial
-import serial
-import serial.tools.list_ports
+import argparse
 import configparser
-import time
 import sys
 import os
-from PIL import Image, ImageTk, UnidentifiedImageError
+import queue
+import threading
+import collections
+import hotplug
+import iconcache
+import discovery
+import metrics
+import protocol
+import relayboard
+import sequencer
+from relayboard import CONFIG_FILE, ALL_RELAYS
 
 # --- Configuration ---
-CONFIG_FILE = 'config.ini'
 ICONS_DIR = 'icons'
 DEFAULT_ON_ICON = 'Onled.png'
 DEFAULT_OFF_ICON = 'Offled.png'
 DEFAULT_ICON_SIZE = (48, 48) 
-BAUD_RATE = 9600
-CH340_HWID = '1A86:7523'
+RESULT_POLL_MS = 20
+HOTPLUG_POLL_MS = 100
+VERIFY_TICK_MS = 1000
+ICON_CACHE_SIZE = 128 # PhotoImages kept for reuse; widgets showing an icon hold their own reference
+PICKER_THUMB_SIZE = (64, 64)
+ICON_POLL_MS = 20
+ICON_PENDING = object() # get_icon() result while an icon is still being decoded
+SCANNED = 'scanned' # Posted with the hotplug events once the startup port scan is done
+SEQUENCE_STOP_TIMEOUT = 2.0 # Longest wait on close for a cancelled sequence to stop
+
+# Pillow and serial.tools.list_ports are only imported when first needed, on background
+# threads, so the window can draw the configured board before either is loaded. (ImageTk
+# needs Tk, so it follows on the Tk thread once the first icon has been decoded.)
+startup_marks = [('imports done', time.perf_counter())]
 
-# --- Command Codebook (Master commands removed) ---
-COMMANDS = {
-    'ON': [bytearray.fromhex(h) for h in ['3A46453035303030304646303046450D0A', '3A46453035303030314646303046440D0A', '3A46453035303030324646303046430D0A', '3A46453035303030334646303046420D0A', '3A46453035303030344646303046410D0A', '3A46453035303030354646303046390D0A', '3A46453035303030364646303046380D0A', '3A46453035303030374646303046370D0A', '3A46453035303030384646303046360D0A', '3A46453035303030394646303046350D0A', '3A46453035303030414646303046340D0A', '3A46453035303030424646303046330D0A', '3A46453035303030434646303046320D0A', '3A46453035303030444646303046310D0A', '3A46453035303030454646303046300D0A', '3A46453035303030464646303046460D0A']],
-    'OFF': [bytearray.fromhex(h) for h in ['3A46453035303030303030303046440D0A', '3A46453035303030313030303046430D0A', '3A46453035303030323030303046420D0A', '3A46453035303030333030303046410D0A', '3A46453035303030343030303046390D0A', '3A46453035303030353030303046380D0A', '3A46453035303030363030303046370D0A', '3A46453035303030373030303046360D0A', '3A46453035303030383030303046350D0A', '3A46453035303030393030303046340D0A', '3A46453035303030413030303046330D0A', '3A46453035303030423030303046320D0A', '3A46453035303030433030303046310D0A', '3A46453035303030443030303046300D0A', '3A46453035303030453030303046460D0A', '3A46453035303030463030303046450D0A']],
-}
+def mark_startup(label):
+    startup_marks.append((label, time.perf_counter()))
 
 class IconManager:
-    # ... (implementation unchanged)
+    # PhotoImages by (filename, size, fit), least recently used first out past ICON_CACHE_SIZE.
+    # Resized pixels come from the on-disk thumbnail cache (iconcache.py), so a resize
+    # happens once per icon file version rather than once per run.
     def __init__(self):
-        self.photo_image_cache = {}
+        self.photo_image_cache = collections.OrderedDict()
         os.makedirs(ICONS_DIR, exist_ok=True)
-    def get_icon(self, filename, size):
-        cache_key = (filename, size)
-        if cache_key in self.photo_image_cache: return self.photo_image_cache[cache_key]
+        self.thumbnails = iconcache.ThumbnailCache(ICONS_DIR)
+        self.loader = None # Background decoder, started by the first request_icon()
+        self.waiting = {} # key -> callbacks for icons the loader is still decoding
+        self.missing = {} # key -> file_version() of an icon that could not be decoded
+        self.unshared = set() # keys being decoded for a caller that keeps them itself (the picker)
+        self.on_request = None # Called when a decode is queued, e.g. to start polling deliver()
+    def cached(self, key):
+        photo_image = self.photo_image_cache.get(key)
+        if photo_image: self.photo_image_cache.move_to_end(key)
+        return photo_image
+    def remember(self, key, photo_image):
+        self.photo_image_cache[key] = photo_image
+        self.photo_image_cache.move_to_end(key)
+        while len(self.photo_image_cache) > ICON_CACHE_SIZE: self.photo_image_cache.popitem(last=False)
+    def file_version(self, filename):
+        # (mtime, size) of an icon file, None if it is gone; the thumbnail cache keys on the same.
         try:
-            path = os.path.join(ICONS_DIR, filename)
-            with Image.open(path) as img:
-                resized_img = img.resize(size, Image.Resampling.LANCZOS)
-                photo_image = ImageTk.PhotoImage(resized_img)
-                self.photo_image_cache[cache_key] = photo_image
-                return photo_image
-        except (FileNotFoundError, UnidentifiedImageError): return None
+            st = os.stat(os.path.join(ICONS_DIR, filename))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+    def is_missing(self, cache_key):
+        # An icon that failed (e.g. while it was still being copied in) is retried once its file changes.
+        return cache_key in self.missing and self.missing[cache_key] == self.file_version(cache_key[0])
+    def get_icon(self, filename, size, on_loaded):
+        # An icon not in memory is decoded in the background: ICON_PENDING is returned now
+        # and on_loaded() runs once it is ready.
+        cache_key = (filename, size, False)
+        if (photo_image := self.cached(cache_key)): return photo_image
+        if self.is_missing(cache_key): return None
+        self.request_icon(filename, size, lambda photo_image: on_loaded(), fit=False)
+        return ICON_PENDING
+    def request_icon(self, filename, size, callback, fit=True, shared=True):
+        # callback(photo_image or None) runs on the Tk thread from deliver(), or right away if known.
+        # shared=False keeps the result out of the LRU, for callers that hold on to it themselves,
+        # so hundreds of picker thumbnails do not push out the relay grid's icons.
+        cache_key = (filename, size, fit)
+        if (photo_image := self.cached(cache_key)) or self.is_missing(cache_key):
+            callback(photo_image)
+        elif cache_key in self.waiting:
+            self.waiting[cache_key].append(callback)
+            if shared: self.unshared.discard(cache_key)
+        else:
+            self.waiting[cache_key] = [callback]
+            if not shared: self.unshared.add(cache_key)
+            if not self.loader: self.loader = iconcache.IconLoader(self.thumbnails)
+            self.loader.request(cache_key, filename, size, fit)
+            if self.on_request: self.on_request()
+    def deliver(self):
+        # Tk thread only: turns decoded images into PhotoImages. True while icons are still pending.
+        for cache_key, img in self.loader.done() if self.loader else []:
+            from PIL import ImageTk # First imported here: the loader thread only needs PIL.Image
+            photo_image = ImageTk.PhotoImage(img) if img else None
+            if not photo_image: self.missing[cache_key] = self.file_version(cache_key[0])
+            elif cache_key not in self.unshared: self.remember(cache_key, photo_image)
+            self.unshared.discard(cache_key)
+            for callback in self.waiting.pop(cache_key, []): callback(photo_image)
+        return bool(self.waiting)
+    def close(self):
+        if self.loader: self.loader.close()
 
 class App(tk.Tk):
     # ... (Most of the class is unchanged) ...
-    def __init__(self):
+    def __init__(self, profile_startup=False):
         super().__init__()
+        mark_startup('Tk initialised')
         self.title("16-Channel USB Relay Controller")
         self.config(bg='gray20')
         self.geometry("600x600")
         self.icon_manager = IconManager()
+        self.icon_poll_scheduled = False
+        self.icon_manager.on_request = self.schedule_icon_poll # Polled only while icons are being decoded
         if not (os.path.exists(os.path.join(ICONS_DIR, DEFAULT_ON_ICON)) and os.path.exists(os.path.join(ICONS_DIR, DEFAULT_OFF_ICON))):
             messagebox.showerror("Startup Error", f"Default icons '{DEFAULT_ON_ICON}' and '{DEFAULT_OFF_ICON}' not found in '{ICONS_DIR}' folder.")
             self.after(100, self.destroy)
             return
         self.config_parser = configparser.ConfigParser()
         self.config_parser.read(CONFIG_FILE)
-        self.current_port_name = None
-        self.serial_port = None
+        self.current_section = None
+        self.board = None
+        self.device_index = discovery.DeviceIndex() # Scanned once at startup, then only on hotplug events
+        self.pool = relayboard.ConnectionPool(self.config_parser, self.device_index.resolve)
         self.relay_widgets = {}
+        self.relay_labels = {}
+        self.dashboard_widgets = {}
+        self.dialogs = {} # Dialog class -> its one instance, hidden between uses
         self.is_connected = False
+        self.blank_icon = tk.PhotoImage(width=DEFAULT_ICON_SIZE[0], height=DEFAULT_ICON_SIZE[1]) # Stand-in while icons load
         self.main_frame = Frame(self, bg='gray30')
         self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        self.module_info_frame = Frame(self.main_frame, bg='gray30')
+        # Three views share main_frame and only one is packed at a time: the relay grid (built
+        # once, then relabelled per board), the dashboard, and a plain message.
+        self.module_view = Frame(self.main_frame, bg='gray30')
+        self.module_info_frame = Frame(self.module_view, bg='gray30')
         self.module_info_frame.pack(fill=tk.X, pady=5)
-        self.relays_frame = Frame(self.main_frame, bg='gray30')
+        self.module_name_label = Label(self.module_info_frame, bg='gray30', fg='cyan', font=("Helvetica", 16, "bold"))
+        self.module_name_label.pack(side=tk.LEFT, padx=10)
+        self.relays_frame = Frame(self.module_view, bg='gray30')
         self.relays_frame.pack(fill=tk.BOTH, expand=True)
+        self.build_relay_grid()
+        self.dashboard_view = Frame(self.main_frame, bg='gray30')
+        self.dashboard_rows = {} # section -> (name label, "Not connected" label, 16 relay buttons)
+        self.build_dashboard()
+        self.message_label = Label(self.main_frame, bg='gray30', fg='white')
         self.status_bar = Label(self, text="No device selected.", bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.profile_startup = profile_startup
         self.create_menu()
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
-        self.after(100, self.load_first_available_module)
-        self.after(2000, self.check_connection)
+        self.after(RESULT_POLL_MS, self.process_serial_results)
+        # Port changes arrive from the watcher thread and are applied on the Tk thread.
+        self.hotplug_events = queue.SimpleQueue()
+        self.hotplug = hotplug.HotplugWatcher(lambda action, device: self.hotplug_events.put((action, device)))
+        self.retry_pending = False
+        self.after(HOTPLUG_POLL_MS, self.process_hotplug_events)
+        self.next_verify = {}
+        self.bad_verify_intervals = {} # section -> verify_interval text already reported as invalid
+        self.after(VERIFY_TICK_MS, self.verify_boards)
+        self.sequences = {} # section -> SequenceRun playing on that board
+        # First frame straight from config.ini; the port scan runs meanwhile and connects when done.
+        self.show_last_known_layout()
+        threading.Thread(target=self.scan_ports, name="startup-scan", daemon=True).start()
+        self.after_idle(mark_startup, 'first frame drawn')
 
     def draw_module_display(self, port_name):
+        # port_name is the board's config section: a stable USB identity, or a device path in older configs.
+        # Reconnects and config saves come through here too; they relabel the grid rather than rebuild it.
         self.clear_main_frame()
-        self.current_port_name = port_name
+        self.current_section = port_name
+        self.show_relay_grid(port_name)
         try:
-            if self.serial_port and self.serial_port.is_open:
-                self.serial_port.close()
-            self.serial_port = serial.Serial(self.current_port_name, BAUD_RATE, timeout=1)
-            self.status_bar.config(text=f"Connected to: {self.current_port_name}", fg='black')
+            self.board = self.pool.get(port_name)
+            self.status_bar.config(text=f"Connected to: {self.board.port} ({self.board.name})", fg='black')
             self.is_connected = True
             print("Connection successful. Initializing GUI...")
-        except serial.SerialException as e:
-            self.status_bar.config(text=f"Failed to connect: {self.current_port_name}", fg='red')
-            Label(self.main_frame, text=f"Error opening port '{self.current_port_name}'.", bg='gray30', fg='red').pack()
+        except ValueError as e:
+            self.status_bar.config(text=f"Invalid board address for {port_name}: {e}", fg='red')
+            self.render_layout_only()
+            self.disable_controls()
+            return
+        except relayboard.SerialException as e:
+            self.status_bar.config(text=f"Failed to connect: {self.current_section} ({e})", fg='red')
             self.is_connected = False
+            self.render_layout_only()
+            self.disable_controls()
+            self.schedule_retry()
             return
 
-        name = self.config_parser.get(port_name, 'name', fallback=port_name)
-        Label(self.module_info_frame, text=name, bg='gray30', fg='cyan', font=("Helvetica", 16, "bold")).pack(side=tk.LEFT, padx=10)
+        if not self.board.state.known:
+            # Freshly opened handle: read the relays back instead of switching anything.
+            self.status_bar.config(text=f"Connected to: {self.board.port} ({self.board.name}) - reading relay state...", fg='black')
+            self.queued(self.board.read_state(self.on_state_read))
+        self.render_relays()
+        self.update_scene_menu()
+        self.enable_controls()
+        if self.profile_startup: mark_startup('board connected')
 
+    def build_relay_grid(self):
+        # Runs once; show_relay_grid() fills in the names for whichever board is shown.
         for i in range(16):
-            rn, r, col = i + 1, i // 4, i % 4
+            r, col = i // 4, i % 4
             frame = Frame(self.relays_frame, bg='gray40', relief=tk.RIDGE, borderwidth=2)
             frame.grid(row=r, column=col, padx=10, pady=10, sticky="nsew")
             self.relays_frame.grid_columnconfigure(col, weight=1)
             self.relays_frame.grid_rowconfigure(r, weight=1)
             
-            lbl_text = self.config_parser.get(port_name, f'relay_{rn}_label', fallback=f'Relay {rn}')
-            label = Label(frame, text=lbl_text, bg='gray40', fg='white', font=("Helvetica", 10))
+            label = Label(frame, bg='gray40', fg='white', font=("Helvetica", 10))
             label.pack(pady=(5, 0))
-            icon_button = Button(frame, text="", width=DEFAULT_ICON_SIZE[0], height=DEFAULT_ICON_SIZE[1], command=partial(self.toggle_relay, i), relief=tk.FLAT, bg='gray40', activebackground='gray50')
+            icon_button = Button(frame, text="", image=self.blank_icon, width=DEFAULT_ICON_SIZE[0], height=DEFAULT_ICON_SIZE[1], command=partial(self.toggle_relay, i), relief=tk.FLAT, bg='gray40', activebackground='gray50', state=tk.DISABLED)
             icon_button.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+            self.relay_labels[i] = label
             self.relay_widgets[i] = icon_button
-        
-        # This will now be called after the main loop starts, ensuring everything is drawn.
-        self.after(100, self.all_off)
-        
-        self.enable_controls()
+
+    def show_relay_grid(self, port_name):
+        self.module_name_label.config(text=self.config_parser.get(port_name, 'name', fallback=port_name))
+        for i, label in self.relay_labels.items():
+            rn = i + 1
+            label.config(text=self.config_parser.get(port_name, f'relay_{rn}_label', fallback=f'Relay {rn}'))
+        self.show_view(self.module_view)
+
+    def show_view(self, view):
+        for widget in (self.module_view, self.dashboard_view, self.message_label):
+            if widget is not view: widget.pack_forget()
+        if not view.winfo_manager(): view.pack(fill=tk.BOTH, expand=True)
+
+    def show_last_known_layout(self):
+        # Startup: the first configured board as it was laid out last time, greyed out until
+        # the port scan says whether it is here. No port or Pillow access on this path.
+        sections = self.config_parser.sections()
+        if not sections:
+            self.show_no_devices()
+            return
+        self.clear_main_frame()
+        self.show_relay_grid(sections[0])
+        self.current_section = sections[0] # Adopted so a hotplug event for it connects straight away
+        self.render_layout_only()
+        self.disable_controls()
+        self.status_bar.config(text="Looking for relay boards...", fg='black')
+
+    def render_layout_only(self):
+        # Relay grid without a board behind it: every relay drawn as off.
+        if self.board or not self.current_section: return
+        for i in self.relay_widgets: self.update_button_style(i, False)
+
+    def scan_ports(self):
+        # Startup scan, off the Tk thread; the result is picked up by process_hotplug_events.
+        self.device_index.refresh()
+        mark_startup('ports scanned')
+        self.hotplug_events.put((SCANNED, None))
     
     # --- START OF MODIFIED SECTION ---
     def all_on(self):
         print("Turning ALL relays ON...")
-        for i in range(16):
-            if self.send_command(COMMANDS['ON'][i]):
-                self.update_button_style(i, True)
-            else:
-                break # Stop if a command fails
-            time.sleep(0.02) # Small delay between commands
+        self.set_all(True)
 
     def all_off(self):
         print("Turning ALL relays OFF...")
-        for i in range(16):
-            if self.send_command(COMMANDS['OFF'][i]):
-                self.update_button_style(i, False)
-            else:
-                break # Stop if a command fails
-            time.sleep(0.02) # Small delay between commands
+        self.set_all(False)
+
+    def set_all(self, state):
+        return self.set_relays(ALL_RELAYS if state else 0)
+
+    def set_relays(self, mask, select=ALL_RELAYS):
+        # Sets every relay whose bit is in `select` to the matching bit of `mask`.
+        # The board diffs against its state model, so unchanged relays cost no serial bytes.
+        if not self.check_board(): return False
+        return self.queued(self.board.apply(mask, select, self.render_relays))
+
+    def on_state_read(self):
+        if not self.board: return
+        self.status_bar.config(text=f"Connected to: {self.board.port} ({self.board.name})", fg='black')
+        self.render_relays()
+
+    def verify_boards(self):
+        # Periodic read-back per board ('verify_interval' seconds in its section, 0 = off).
+        self.after(VERIFY_TICK_MS, self.verify_boards) # First, so one bad board cannot stop the timer
+        now = time.monotonic()
+        for section, board in list(self.pool.boards.items()):
+            interval = self.verify_interval(section)
+            if interval <= 0 or not board.is_open or now < self.next_verify.get(section, 0): continue
+            self.next_verify[section] = now + interval
+            board.verify(partial(self.check_drift, section, board))
+
+    def verify_interval(self, section):
+        # A hand-edited value that is not a number turns verification off for that board, reported once.
+        text = self.config_parser.get(section, 'verify_interval', fallback='')
+        try:
+            return float(text or 0)
+        except ValueError:
+            if self.bad_verify_intervals.get(section) != text:
+                self.bad_verify_intervals[section] = text
+                message = f"{section}: verify_interval '{text}' is not a number; not verifying this board"
+                print(message)
+                self.status_bar.config(text=message, fg='orange')
+            return 0
+
+    def check_drift(self, section, board):
+        # The model already follows the board; 'on_drift = restore' re-applies what we expected.
+        if not board.last_drift: return
+        expected, actual = board.last_drift
+        board.last_drift = None
+        message = f"Relay state drift on {board.name}: expected {expected:04X}, board reports {actual:04X}"
+        print(message)
+        if self.config_parser.get(section, 'on_drift', fallback='adopt') == 'restore' and board.is_open:
+            board.apply(expected, on_done=self.render_relays)
+            message += " - restoring"
+        if board is self.board:
+            self.status_bar.config(text=message, fg='orange')
+            self.render_relays()
+
+    def build_dashboard(self):
+        # Runs once; rows are added by update_dashboard() as boards are configured.
+        info_frame = Frame(self.dashboard_view, bg='gray30')
+        info_frame.pack(fill=tk.X, pady=5)
+        self.dashboard_rows_frame = Frame(self.dashboard_view, bg='gray30')
+        self.dashboard_rows_frame.pack(fill=tk.BOTH, expand=True)
+        Label(info_frame, text="All Boards", bg='gray30', fg='cyan', font=("Helvetica", 16, "bold")).pack(side=tk.LEFT, padx=10)
+        Button(info_frame, text="All OFF", command=partial(self.set_all_boards, False)).pack(side=tk.RIGHT, padx=5)
+        Button(info_frame, text="All ON", command=partial(self.set_all_boards, True)).pack(side=tk.RIGHT, padx=5)
+
+    def build_dashboard_row(self, section):
+        rows_frame = self.dashboard_rows_frame
+        name_label = Label(rows_frame, bg='gray30', fg='white', anchor='w', width=16)
+        status_label = Label(rows_frame, text="Not connected", bg='gray30', fg='red')
+        buttons = [Button(rows_frame, text=str(i + 1), width=2, relief=tk.FLAT, command=partial(self.toggle_board_relay, section, i)) for i in range(16)]
+        name_label.placed = None # (row, connected) it is gridded at
+        return name_label, status_label, buttons
+
+    def draw_dashboard(self):
+        # Every configured board at once, each driven through its own pooled connection and worker.
+        self.clear_main_frame()
+        self.show_view(self.dashboard_view)
+        self.update_dashboard()
+
+    def update_dashboard(self):
+        # Also run on hotplug events. Rows are kept and only re-gridded when a board comes or
+        # goes; only boards that are not open already are (re)opened.
+        sections = self.config_parser.sections()
+        failed = self.pool.open_all([s for s in sections if not (s in self.pool.boards and self.pool.boards[s].is_open)])
+        for section in set(self.dashboard_rows) - set(sections): # Removed from the config
+            name_label, status_label, buttons = self.dashboard_rows.pop(section)
+            for widget in [name_label, status_label] + buttons: widget.destroy()
+        self.dashboard_widgets = {}
+        for row, section in enumerate(sections):
+            if section not in self.dashboard_rows: self.dashboard_rows[section] = self.build_dashboard_row(section)
+            name_label, status_label, buttons = self.dashboard_rows[section]
+            name_label.config(text=self.config_parser.get(section, 'name', fallback=section))
+            connected = section not in failed
+            if name_label.placed != (row, connected):
+                name_label.placed = (row, connected)
+                name_label.grid(row=row, column=0, sticky='w', padx=5, pady=3)
+                if connected:
+                    status_label.grid_remove()
+                    for i, btn in enumerate(buttons): btn.grid(row=row, column=i + 1, padx=1, pady=3)
+                else:
+                    status_label.grid(row=row, column=1, columnspan=16, sticky='w')
+                    for btn in buttons: btn.grid_remove()
+            if not connected: continue
+            self.dashboard_widgets[section] = buttons
+            board = self.pool.boards[section]
+            if not board.state.known: board.read_state(self.render_dashboard)
+        connected = len(self.dashboard_widgets)
+        self.status_bar.config(text=f"Dashboard: {connected} of {len(sections)} boards connected", fg='black' if not failed else 'red')
+        self.render_dashboard()
+
+    def render_dashboard(self):
+        for section, buttons in self.dashboard_widgets.items():
+            board = self.pool.boards.get(section)
+            for i, btn in enumerate(buttons):
+                if not board or not board.is_open:
+                    btn.config(bg='gray50', state=tk.DISABLED)
+                else:
+                    btn.config(bg='green' if board.state.is_on(i) else 'red', state=tk.NORMAL)
+
+    def toggle_board_relay(self, section, relay_index):
+        board = self.pool.boards.get(section)
+        if board and board.is_open:
+            self.queued(board.set_relay(relay_index, not board.state.target_is_on(relay_index), self.render_dashboard), section)
+
+    def set_all_boards(self, state):
+        accepted = self.pool.apply_group(ALL_RELAYS if state else 0, on_done=self.render_dashboard)
+        busy = [section for section, ok in accepted.items() if not ok]
+        if busy: self.status_bar.config(text=f"Busy: command queue full on {len(busy)} board(s)", fg='red')
+
+    def render_relays(self):
+        # Buttons always show the board's state model, never their own idea of it.
+        if self.dashboard_widgets: self.render_dashboard()
+        if not self.board: return
+        for i in self.relay_widgets:
+            self.update_button_style(i, self.board.state.is_on(i))
     # --- END OF MODIFIED SECTION ---
 
     # --- Other App class methods remain largely unchanged ---
+    def process_hotplug_events(self):
+        changed = False
+        while True:
+            try:
+                action, device = self.hotplug_events.get_nowait()
+            except queue.Empty:
+                break
+            if action == SCANNED:
+                self.migrate_sections()
+                if not self.is_connected and not self.dashboard_view.winfo_manager(): self.load_first_available_module()
+                self.print_startup_profile()
+                continue
+            print(f"Hotplug: {device} {action}")
+            if action == hotplug.REMOVE: self.pool.discard_device(device)
+            changed = True
+        if changed:
+            self.device_index.refresh()
+            self.migrate_sections()
+            if self.dashboard_view.winfo_manager(): self.update_dashboard()
+            else: self.check_connection()
+        self.after(HOTPLUG_POLL_MS, self.process_hotplug_events)
+    def migrate_sections(self):
+        # Older configs name boards after their tty; move them to the identity of the board now on it.
+        renamed = discovery.migrate_sections(self.config_parser, self.device_index)
+        if not renamed: return
+        for old, new in renamed.items():
+            print(f"Config: {old} is now stored as {new}")
+            self.pool.discard(old)
+        with open(CONFIG_FILE, 'w') as configfile:
+            self.config_parser.write(configfile)
+        self.update_view_menu()
+        if self.current_section in renamed:
+            if self.is_connected: self.draw_module_display(renamed[self.current_section])
+            else: self.current_section = renamed[self.current_section]
     def check_connection(self):
-        if not self.current_port_name:
-            self.after(2000, self.check_connection)
+        # Runs on hotplug events, and on a backoff timer while a present board fails to open.
+        self.retry_pending = False
+        if not self.current_section:
             return
-        available_ports = [p.device for p in serial.tools.list_ports.comports()]
-        if self.current_port_name in available_ports:
+        if self.device_index.resolve(self.current_section):
             if not self.is_connected:
-                print(f"Device {self.current_port_name} reconnected. Re-initializing.")
-                self.draw_module_display(self.current_port_name)
+                print(f"Device {self.current_section} reconnected. Re-initializing.")
+                self.draw_module_display(self.current_section)
         else:
             if self.is_connected:
-                print(f"Device {self.current_port_name} disconnected.")
+                print(f"Device {self.current_section} disconnected.")
                 self.is_connected = False
-                if self.serial_port and self.serial_port.is_open: self.serial_port.close()
-                self.status_bar.config(text=f"DISCONNECTED: {self.current_port_name}", fg='red')
+                self.pool.discard(self.current_section)
+                self.board = None
+                self.status_bar.config(text=f"DISCONNECTED: {self.current_section}", fg='red')
                 self.disable_controls()
-        self.after(2000, self.check_connection)
+    def schedule_retry(self):
+        if self.retry_pending or not self.current_section: return
+        self.retry_pending = True
+        self.after(int(self.pool.retry_delay(self.current_section) * 1000) + 50, self.check_connection)
     def disable_controls(self):
         for button in self.relay_widgets.values():
             button.config(state=tk.DISABLED)
@@ -163,84 +472,231 @@ class App(tk.Tk):
         self.view_menu = tk.Menu(config_menu, tearoff=0)
         config_menu.add_cascade(label="View Module", menu=self.view_menu)
         self.update_view_menu()
+        config_menu.add_separator()
+        config_menu.add_command(label="Export Metrics...", command=self.export_metrics)
+        self.scene_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Scenes", menu=self.scene_menu)
+        self.update_scene_menu()
+    def update_scene_menu(self):
+        # Scenes and sequences of the board on screen ('scene_<name>' / 'sequence_<name>' keys).
+        self.scene_menu.delete(0, 'end')
+        section = self.current_section
+        if not section or not self.config_parser.has_section(section):
+            self.scene_menu.add_command(label="(no module selected)", state=tk.DISABLED)
+            return
+        scenes = sequencer.board_scene_names(self.config_parser, section)
+        sequences = sequencer.sequence_names(self.config_parser, section)
+        for name in scenes:
+            self.scene_menu.add_command(label=f"Scene: {name}", command=partial(self.apply_scene, name))
+        if scenes and sequences: self.scene_menu.add_separator()
+        for name in sequences:
+            self.scene_menu.add_command(label=f"Run: {name}", command=partial(self.run_sequence, name))
+        if not scenes and not sequences:
+            self.scene_menu.add_command(label="(none configured)", state=tk.DISABLED)
+        self.scene_menu.add_separator()
+        self.scene_menu.add_command(label="Stop Sequence", command=self.stop_sequence)
+    def apply_scene(self, name):
+        try:
+            (_, mask, select), = sequencer.load_scene(self.config_parser, self.current_section, name)
+        except ValueError as e:
+            messagebox.showerror("Scene Error", str(e), parent=self)
+            return
+        self.set_relays(mask, select)
+    def run_sequence(self, name):
+        # Played on its own thread; each step comes back through process_serial_results to redraw.
+        if not self.check_board(): return
+        section = self.current_section
+        try:
+            steps = sequencer.load_sequence(self.config_parser, section, name)
+        except ValueError as e:
+            messagebox.showerror("Sequence Error", str(e), parent=self)
+            return
+        self.stop_sequence()
+        run = sequencer.SequenceRun(self.board, steps, name, on_step=self.render_relays)
+        run.on_finish = partial(self.on_sequence_done, section, run)
+        self.sequences[section] = run
+        run.start()
+        self.status_bar.config(text=f"Running sequence '{name}' on {self.board.name}...", fg='black')
+    def stop_sequence(self):
+        run = self.sequences.get(self.current_section)
+        if run: run.cancel()
+    def on_sequence_done(self, section, run):
+        if self.sequences.get(section) is run: del self.sequences[section]
+        report = run.report()
+        print(report)
+        if section == self.current_section: self.status_bar.config(text=report, fg='black')
     def update_view_menu(self):
         self.view_menu.delete(0, 'end')
+        self.view_menu.add_command(label="Dashboard (All Boards)", command=self.draw_dashboard)
+        self.view_menu.add_separator()
         for section in self.config_parser.sections():
             name = self.config_parser.get(section, 'name', fallback=section)
             self.view_menu.add_command(label=name, command=lambda s=section: self.draw_module_display(s))
     def load_first_available_module(self):
-        available_ports = [p.device for p in serial.tools.list_ports.comports()]
+        self.device_index.ensure_scanned()
         for section in self.config_parser.sections():
-            if section in available_ports:
+            if self.device_index.resolve(section):
                 self.draw_module_display(section)
                 return
+        self.show_no_devices()
+    def show_no_devices(self):
         self.clear_main_frame()
-        Label(self.main_frame, text="No configured devices connected.\nGo to Configure -> Devices to add one.", bg='gray30', fg='white').pack(pady=50)
+        self.status_bar.config(text="No device selected.", fg='black')
+        self.message_label.config(text="No configured devices connected.\nGo to Configure -> Devices to add one.")
+        self.show_view(self.message_label)
+    def export_metrics(self):
+        # Serial-path metrics of every board opened this session; '.json' or Prometheus text.
+        path = filedialog.asksaveasfilename(parent=self, title="Export Metrics", defaultextension='.prom',
+                                            filetypes=[("Prometheus text", "*.prom"), ("JSON", "*.json")])
+        if not path: return
+        snapshots = self.pool.metrics_snapshot()
+        try:
+            with open(path, 'w') as f:
+                f.write(metrics.to_json(snapshots) if path.lower().endswith('.json') else metrics.to_prometheus(snapshots))
+        except OSError as e:
+            messagebox.showerror("Export Error", str(e), parent=self)
+            return
+        self.status_bar.config(text=f"Metrics for {len(snapshots)} board(s) saved to {path}", fg='black')
     def open_device_manager(self):
-        DeviceManagerWindow(self)
+        self.dialog(DeviceManagerWindow).open()
+    def dialog(self, cls):
+        # Dialogs are built on first use and kept, hidden, for the next time (see ReusableDialog).
+        if cls not in self.dialogs: self.dialogs[cls] = cls(self)
+        return self.dialogs[cls]
     def clear_main_frame(self):
         self.is_connected = False
-        self.current_port_name = None
-        if self.serial_port and self.serial_port.is_open: self.serial_port.close()
-        self.serial_port = None
-        self.relay_widgets = {}
-        for widget in self.module_info_frame.winfo_children(): widget.destroy()
-        for widget in self.relays_frame.winfo_children(): widget.destroy()
-        for widget in self.main_frame.winfo_children():
-            if widget not in (self.module_info_frame, self.relays_frame): widget.destroy()
-    def send_command(self, command_bytes):
-        if not self.serial_port or not self.serial_port.is_open:
-            self.is_connected = False
-            self.disable_controls()
-            self.status_bar.config(text=f"DISCONNECTED: {self.current_port_name}", fg='red')
-            return False
-        try:
-            self.serial_port.write(command_bytes)
-            # time.sleep(0.05) # Delay is now handled in the loop methods
-            return True
-        except serial.SerialException as e:
-            self.status_bar.config(text=f"Communication Error: {e}", fg='red')
+        self.current_section = None
+        self.board = None # The handle stays open in the pool for the next view of this board
+        self.dashboard_widgets = {} # Rows are kept for the next visit, like the relay grid
+        self.update_scene_menu()
+    def check_board(self):
+        if not self.board or not self.board.is_open:
             self.is_connected = False
             self.disable_controls()
+            self.status_bar.config(text=f"DISCONNECTED: {self.current_section}", fg='red')
             return False
+        return True
+    def queued(self, accepted, section=None):
+        # section: a board on the dashboard rather than the one shown.
+        if not accepted:
+            board = self.pool.boards.get(section) if section else self.board
+            depth = board.queue_depth() if board else 0
+            self.status_bar.config(text=f"Busy: command queue full on {section or self.current_section} ({depth} pending)", fg='red')
+        return accepted
+    def process_serial_results(self):
+        # Drains every pooled board; callbacks that draw only touch the board currently shown.
+        for section, board in list(self.pool.boards.items()):
+            for on_done, error in board.completed():
+                if isinstance(error, protocol.ProtocolError):
+                    # The port is fine, the board just gave no usable answer (e.g. to a status query).
+                    print(f"Protocol error on {section}: {error}")
+                    if board is self.board:
+                        self.status_bar.config(text=f"Connected to: {board.port} ({board.name}) - relay state unknown: {error}", fg='orange')
+                    continue
+                if error:
+                    print(f"Communication error on {section}: {error}")
+                    self.pool.mark_failed(section)
+                    if board is self.board:
+                        self.status_bar.config(text=f"Communication Error: {error}", fg='red')
+                        self.is_connected = False
+                        self.disable_controls()
+                        self.schedule_retry()
+                    if self.dashboard_widgets: self.render_dashboard()
+                    break
+                if on_done:
+                    on_done()
+        self.after(RESULT_POLL_MS, self.process_serial_results)
+    def schedule_icon_poll(self):
+        if self.icon_poll_scheduled: return
+        self.icon_poll_scheduled = True
+        self.after(ICON_POLL_MS, self.process_icon_results)
+    def process_icon_results(self):
+        self.icon_poll_scheduled = False
+        if self.icon_manager.deliver():
+            self.schedule_icon_poll()
+        elif self.profile_startup:
+            mark_startup('icons shown')
+            self.print_startup_profile()
+    def print_startup_profile(self):
+        # --profile-startup: printed once the port scan is done and no icon is still loading.
+        if not self.profile_startup or self.icon_manager.waiting or 'ports scanned' not in dict(startup_marks): return
+        self.profile_startup = False
+        print("Startup profile (ms since gui.py started loading):")
+        previous = STARTED
+        for label, at in sorted(startup_marks, key=lambda item: item[1]):
+            print(f"  {(at - STARTED) * 1000:8.1f}  (+{(at - previous) * 1000:6.1f})  {label}")
+            previous = at
+        print("  Per-module import times: python3 -X importtime gui.py")
     def on_closing(self):
-        if self.serial_port and self.serial_port.is_open:
-            self.all_off() # Use the loop to turn all off
-            time.sleep(0.5) # Give time for commands to finish
-            self.serial_port.close()
+        for run in self.sequences.values(): run.cancel()
+        # A run may be past its wait and about to apply a step: let it finish first, so the
+        # all-off below is the last write each board gets.
+        for run in self.sequences.values(): run.join(SEQUENCE_STOP_TIMEOUT)
+        boards = self.pool.open_boards()
+        if boards: self.withdraw()
+        for board in boards:
+            # Blocking put here: shutdown waits for room rather than dropping the all-off write.
+            board.all_off(block=True)
+        self.pool.close_all(drain=True)
+        self.hotplug.close(timeout=1)
+        self.icon_manager.close()
         self.destroy()
     def toggle_relay(self, relay_index):
-        current_state_is_on = self.relay_widgets[relay_index]._state_is_on
-        new_state = not current_state_is_on
-        command_type = 'ON' if new_state else 'OFF'
-        command = COMMANDS[command_type][relay_index]
-        if self.send_command(command):
-            self.update_button_style(relay_index, new_state)
+        # Toggle against the queued target so quick repeated clicks alternate as expected.
+        if not self.check_board(): return
+        self.queued(self.board.set_relay(relay_index, not self.board.state.target_is_on(relay_index), self.render_relays))
     def update_button_style(self, relay_index, state):
         btn = self.relay_widgets[relay_index]
-        btn._state_is_on = state
-        port_name = self.current_port_name
+        port_name = self.current_section
         relay_num = relay_index + 1
         state_str = 'on' if state else 'off'
         icon_filename = self.config_parser.get(port_name, f'relay_{relay_num}_icon_{state_str}', fallback=None)
         if not icon_filename: icon_filename = DEFAULT_ON_ICON if state else DEFAULT_OFF_ICON
-        icon = self.icon_manager.get_icon(icon_filename, DEFAULT_ICON_SIZE)
-        if icon:
-            btn.config(image=icon, width=DEFAULT_ICON_SIZE[0], height=DEFAULT_ICON_SIZE[1])
-            btn.image = icon
+        icon = self.icon_manager.get_icon(icon_filename, DEFAULT_ICON_SIZE, self.render_relays if self.board else self.render_layout_only)
+        if icon is ICON_PENDING:
+            # Same size as the icon, coloured by state until it has been decoded.
+            style = (self.blank_icon, 'green' if state else 'red') + DEFAULT_ICON_SIZE
+        elif icon:
+            style = (icon, 'gray40') + DEFAULT_ICON_SIZE
         else:
             fallback_color = 'green' if state else 'red'
-            btn.config(image='', bg=fallback_color, width=6, height=3)
+            style = ('', fallback_color, 6, 3)
+        if getattr(btn, 'style', None) == style: return # Unchanged: no reconfigure, no redraw
+        btn.style = style # Also keeps the PhotoImage alive
+        image, bg, width, height = style
+        btn.config(image=image, bg=bg, width=width, height=height)
 
-# --- All other classes (DeviceManagerWindow, IconPickerDialog, ModuleEditDialog) remain unchanged ---
-class DeviceManagerWindow(Toplevel):
-    def __init__(self, parent):
-        super().__init__(parent)
-        self.parent = parent
-        self.config_parser = parent.config_parser
-        self.title("Device Manager")
-        self.transient(parent)
+# --- Dialogs: each one is built on first use (App.dialog) and hidden, not destroyed, on close ---
+class ReusableDialog(Toplevel):
+    # show() opens it over `opener`; with wait=True it returns once the dialog is hidden again.
+    # Hiding hands the input grab back to the window that had it before, e.g. the Device Manager.
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.withdraw()
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+        self.hidden = tk.BooleanVar(self, True)
+        self.previous_grab = None
+    def show(self, opener, wait=True):
+        self.transient(opener)
+        self.previous_grab = self.grab_current()
+        self.hidden.set(False)
+        self.deiconify()
+        self.lift()
         self.grab_set()
+        if wait: self.wait_variable(self.hidden)
+    def hide(self):
+        self.grab_release()
+        self.withdraw()
+        previous, self.previous_grab = self.previous_grab, None
+        if previous and previous is not self and previous.winfo_exists() and previous.winfo_viewable(): previous.grab_set()
+        self.hidden.set(True)
+class DeviceManagerWindow(ReusableDialog):
+    def __init__(self, app):
+        super().__init__(app)
+        self.parent = app
+        self.config_parser = app.config_parser
+        self.title("Device Manager")
         self.detected_ports = []
         Label(self, text="Detected Relay Boards:", font=('Helvetica', 10, 'bold')).pack(pady=5)
         self.listbox = Listbox(self, width=60, height=10)
@@ -251,123 +707,150 @@ class DeviceManagerWindow(Toplevel):
         Button(btn_frame, text="Configure...", command=self.configure_selected).pack(side=tk.LEFT, padx=5)
         Button(btn_frame, text="Edit", command=self.edit_selected).pack(side=tk.LEFT, padx=5)
         Button(btn_frame, text="Remove", command=self.remove_selected).pack(side=tk.LEFT, padx=5)
-        Button(btn_frame, text="Refresh", command=self.populate_list).pack(side=tk.LEFT, padx=5)
+        Button(btn_frame, text="Refresh", command=self.rescan).pack(side=tk.LEFT, padx=5)
+    def open(self):
         self.populate_list()
+        self.show(self.parent, wait=False)
     def populate_list(self):
         self.listbox.delete(0, 'end')
-        self.detected_ports = [p for p in serial.tools.list_ports.comports() if CH340_HWID in p.hwid.upper()]
-        configured_ports = self.config_parser.sections()
+        self.detected_ports = self.parent.device_index.ensure_scanned().boards()
+        configured_sections = self.config_parser.sections()
         for port in self.detected_ports:
-            if port.device in configured_ports:
-                name = self.config_parser.get(port.device, 'name', fallback=port.device)
+            section = self.parent.device_index.section_for(port, configured_sections)
+            if section in configured_sections:
+                name = self.config_parser.get(section, 'name', fallback=port.device)
                 self.listbox.insert('end', f"{name} ({port.device}) [Configured]")
                 self.listbox.itemconfig('end', {'fg': 'blue'})
             else:
                 self.listbox.insert('end', f"{port.device} - {port.description} [New]")
                 self.listbox.itemconfig('end', {'fg': 'green'})
-    def get_selected_port_device(self):
+    def rescan(self):
+        self.parent.device_index.refresh()
+        self.parent.migrate_sections()
+        self.populate_list()
+    def get_selected_section(self):
         if not (sel := self.listbox.curselection()): return None
-        list_string = self.listbox.get(sel[0])
-        for port in self.detected_ports:
-            if port.device in list_string:
-                return port.device
-        return None
+        port = self.detected_ports[sel[0]]
+        return self.parent.device_index.section_for(port, self.config_parser.sections())
     def on_double_click(self, event):
         self.configure_selected()
     def configure_selected(self):
-        port_device = self.get_selected_port_device()
-        if not port_device: return
-        if port_device in self.config_parser.sections():
+        section = self.get_selected_section()
+        if not section: return
+        if section in self.config_parser.sections():
             messagebox.showinfo("Already Configured", "This device is already configured. Use 'Edit' to change its settings.", parent=self)
             return
-        dialog = ModuleEditDialog(self, f"Configure {port_device}", port_device)
-        self.wait_window(dialog)
-        if dialog.was_saved:
+        if self.parent.dialog(ModuleEditDialog).edit(self, f"Configure {section}", section):
             self.parent.update_view_menu()
-            self.parent.draw_module_display(port_device)
+            self.parent.draw_module_display(section)
             self.populate_list()
     def edit_selected(self):
-        port_device = self.get_selected_port_device()
-        if not port_device: return
-        if port_device not in self.config_parser.sections():
+        section = self.get_selected_section()
+        if not section: return
+        if section not in self.config_parser.sections():
             messagebox.showinfo("Not Configured", "This device is not configured yet. Use 'Configure' to add it.", parent=self)
             return
-        dialog = ModuleEditDialog(self, f"Edit {port_device}", port_device)
-        self.wait_window(dialog)
-        if dialog.was_saved:
+        if self.parent.dialog(ModuleEditDialog).edit(self, f"Edit {section}", section):
             self.parent.update_view_menu()
-            if self.parent.current_port_name == port_device: self.parent.draw_module_display(port_device)
+            if self.parent.current_section == section: self.parent.draw_module_display(section)
             self.populate_list()
     def remove_selected(self):
-        port_device = self.get_selected_port_device()
-        if not port_device: return
-        if port_device not in self.config_parser.sections(): return
-        if messagebox.askyesno("Confirm Removal", f"Are you sure you want to remove the configuration for {port_device}?", parent=self):
-            self.config_parser.remove_section(port_device)
+        section = self.get_selected_section()
+        if not section: return
+        if section not in self.config_parser.sections(): return
+        if messagebox.askyesno("Confirm Removal", f"Are you sure you want to remove the configuration for {section}?", parent=self):
+            self.config_parser.remove_section(section)
+            self.parent.pool.discard(section)
             with open(CONFIG_FILE, 'w') as configfile:
                 self.config_parser.write(configfile)
             self.parent.update_view_menu()
             self.populate_list()
-            if self.parent.current_port_name == port_device:
+            if self.parent.current_section == section:
                 self.parent.load_first_available_module()
-class IconPickerDialog(Toplevel):
-    def __init__(self, parent):
-        super().__init__(parent)
-        self.transient(parent)
-        self.grab_set()
+class IconPickerDialog(ReusableDialog):
+    # Starts with a blank placeholder per icon; thumbnails are decoded in the background
+    # (and kept on disk) and swapped in as App.process_icon_results delivers them.
+    # The button grid is only rebuilt when the icons folder lists different files; an icon
+    # edited since the last visit only gets its thumbnail decoded again.
+    def __init__(self, app):
+        super().__init__(app)
         self.title("Select an Icon")
         self.result = None
-        self.photo_images = []
-        icon_files = sorted([f for f in os.listdir(ICONS_DIR) if f.lower().endswith(('.png', '.gif', '.jpg', '.jpeg'))])
-        cols = 4
-        for i, filename in enumerate(icon_files):
-            try:
+        self.icon_manager = app.icon_manager
+        self.icon_versions = {} # filename -> IconManager.file_version() when its thumbnail was requested
+        self.buttons = {}
+        self.photo_images = {} # The thumbnails shown here; kept here rather than in the shared LRU
+        self.placeholder = tk.PhotoImage(width=PICKER_THUMB_SIZE[0], height=PICKER_THUMB_SIZE[1])
+        self.canvas = Canvas(self, width=6 * (PICKER_THUMB_SIZE[0] + 20), height=4 * (PICKER_THUMB_SIZE[1] + 20))
+        scrollbar = tk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.grid_frame = Frame(self.canvas)
+        self.grid_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        self.canvas.create_window((0, 0), window=self.grid_frame, anchor="nw")
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+    def choose(self, opener):
+        # The picked file name, or None if the picker was closed.
+        self.result = None
+        self.refresh()
+        self.show(opener)
+        return self.result
+    def refresh(self):
+        versions = {filename: self.icon_manager.file_version(filename) for filename in iconcache.list_icons(ICONS_DIR)}
+        changed = [filename for filename, version in versions.items() if self.icon_versions.get(filename) != version]
+        if list(versions) != list(self.icon_versions):
+            self.photo_images, self.buttons = {}, {}
+            for widget in self.grid_frame.winfo_children(): widget.destroy()
+            cols = 6
+            for i, filename in enumerate(versions):
                 row, col = divmod(i, cols)
-                img = Image.open(os.path.join(ICONS_DIR, filename))
-                img.thumbnail((64, 64), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                self.photo_images.append(photo)
-                Button(self, image=photo, command=lambda f=filename: self.select_icon(f)).grid(row=row, column=col, padx=5, pady=5)
-            except Exception as e:
-                print(f"Could not load icon for picker: {filename}, Error: {e}")
+                button = self.buttons[filename] = Button(self.grid_frame, image=self.placeholder, bg='gray80', command=lambda f=filename: self.select_icon(f))
+                button.grid(row=row, column=col, padx=5, pady=5)
+            changed = list(versions)
+            self.canvas.yview_moveto(0)
+        self.icon_versions = versions
+        for filename in changed:
+            self.icon_manager.request_icon(filename, PICKER_THUMB_SIZE, partial(self.show_thumbnail, self.buttons[filename], filename), shared=False)
+    def show_thumbnail(self, button, filename, photo):
+        if not button.winfo_exists(): return # Grid rebuilt before this one was decoded
+        if photo:
+            self.photo_images[filename] = photo
+            button.config(image=photo, text='', state=tk.NORMAL)
+        else:
+            button.config(image='', text=filename, state=tk.DISABLED)
     def select_icon(self, filename):
         self.result = filename
-        self.destroy()
-class ModuleEditDialog(Toplevel):
-    def __init__(self, parent, title, port_name):
-        super().__init__(parent)
-        self.parent = parent
-        self.config_parser = parent.config_parser
-        self.port_name = port_name
+        self.hide()
+class ModuleEditDialog(ReusableDialog):
+    # One instance serves every board: edit() refills the same 16 rows of widgets.
+    def __init__(self, app):
+        super().__init__(app)
+        self.config_parser = app.config_parser
+        self.port_name = None
         self.was_saved = False
-        self.title(title)
-        self.transient(parent)
-        self.grab_set()
         self.entries = {}
         self.icon_labels = {}
         self.icon_filenames = {}
         main_frame = Frame(self)
         main_frame.pack(fill=tk.BOTH, expand=True)
-        canvas = Canvas(main_frame)
+        self.canvas = canvas = Canvas(main_frame)
         scrollbar = tk.Scrollbar(main_frame, orient="vertical", command=canvas.yview)
         scrollable_frame = Frame(canvas)
         scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
         canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
         canvas.configure(yscrollcommand=scrollbar.set)
-        def _on_mousewheel(event):
-            if sys.platform == "linux":
-                if event.num == 4: canvas.yview_scroll(-1, "units")
-                elif event.num == 5: canvas.yview_scroll(1, "units")
-            else: canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        self.bind_all("<MouseWheel>", _on_mousewheel)
-        self.bind_all("<Button-4>", _on_mousewheel)
-        self.bind_all("<Button-5>", _on_mousewheel)
         Label(scrollable_frame, text="Module Nickname:").grid(row=0, column=0, columnspan=2, sticky='w', padx=5, pady=2)
         self.entries['name'] = Entry(scrollable_frame, width=50)
         self.entries['name'].grid(row=1, column=0, columnspan=2, sticky='ew', padx=5, pady=(0, 10))
+        Label(scrollable_frame, text="Board Address (hex, blank for FE):").grid(row=2, column=0, columnspan=2, sticky='w', padx=5, pady=2)
+        self.entries['address'] = Entry(scrollable_frame, width=10)
+        self.entries['address'].grid(row=3, column=0, columnspan=2, sticky='w', padx=5, pady=(0, 10))
+        Label(scrollable_frame, text="Verify State Every (seconds, blank or 0 = off):").grid(row=4, column=0, columnspan=2, sticky='w', padx=5, pady=2)
+        self.entries['verify_interval'] = Entry(scrollable_frame, width=10)
+        self.entries['verify_interval'].grid(row=5, column=0, columnspan=2, sticky='w', padx=5, pady=(0, 10))
         for i in range(16):
             rn = i + 1
-            row_base = i * 3 + 2
+            row_base = i * 3 + 6
             Label(scrollable_frame, text=f"Relay {rn} Label:").grid(row=row_base, column=0, sticky='w', padx=5, pady=2)
             self.entries[f'relay_{rn}_label'] = Entry(scrollable_frame, width=40)
             self.entries[f'relay_{rn}_label'].grid(row=row_base, column=1, sticky='w', padx=5, pady=2)
@@ -377,24 +860,43 @@ class ModuleEditDialog(Toplevel):
             Button(scrollable_frame, text="OFF Icon...", command=lambda r=rn: self.pick_icon(r, 'off')).grid(row=row_base + 2, column=0, sticky='w', padx=5, pady=2)
             self.icon_labels[f'{rn}_off'] = Label(scrollable_frame, text="Default", fg='gray50', width=30, anchor='w')
             self.icon_labels[f'{rn}_off'].grid(row=row_base + 2, column=1, sticky='w', padx=5)
-        if self.port_name in self.config_parser.sections(): self.load_data()
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         Button(self, text="Save", command=self.save).pack(pady=10)
-        self.protocol("WM_DELETE_WINDOW", self.on_dialog_close)
-    def on_dialog_close(self):
+    def edit(self, opener, title, port_name):
+        # Modal; True if the settings were saved.
+        self.title(title)
+        self.port_name = port_name
+        self.was_saved = False
+        self.load_data()
+        self.canvas.yview_moveto(0)
+        self.bind_all("<MouseWheel>", self.on_mousewheel)
+        self.bind_all("<Button-4>", self.on_mousewheel)
+        self.bind_all("<Button-5>", self.on_mousewheel)
+        self.show(opener)
+        return self.was_saved
+    def on_mousewheel(self, event):
+        if sys.platform == "linux":
+            if event.num == 4: self.canvas.yview_scroll(-1, "units")
+            elif event.num == 5: self.canvas.yview_scroll(1, "units")
+        else: self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+    def hide(self):
         self.unbind_all("<MouseWheel>")
         self.unbind_all("<Button-4>")
         self.unbind_all("<Button-5>")
-        self.destroy()
+        super().hide()
     def pick_icon(self, relay_num, state):
-        dialog = IconPickerDialog(self)
-        self.wait_window(dialog)
-        if dialog.result:
+        filename = self.app.dialog(IconPickerDialog).choose(self)
+        if filename:
             key = f'{relay_num}_{state}'
-            self.icon_filenames[key] = dialog.result
-            self.icon_labels[key].config(text=dialog.result, fg='black')
+            self.icon_filenames[key] = filename
+            self.icon_labels[key].config(text=filename, fg='black')
     def load_data(self):
+        # Clears what the previous board left behind, then fills in this one (if configured).
+        self.icon_filenames = {}
+        for entry in self.entries.values(): entry.delete(0, 'end')
+        for label in self.icon_labels.values(): label.config(text="Default", fg='gray50')
+        if not self.config_parser.has_section(self.port_name): return
         for key, entry in self.entries.items():
             entry.insert(0, self.config_parser.get(self.port_name, key, fallback=''))
         for rn in range(1, 17):
@@ -405,6 +907,16 @@ class ModuleEditDialog(Toplevel):
                     self.icon_filenames[key] = icon_file
                     self.icon_labels[key].config(text=icon_file, fg='black')
     def save(self):
+        try:
+            protocol.parse_address(self.entries['address'].get().strip())
+        except ValueError:
+            messagebox.showerror("Invalid Address", "Board address must be a hex byte, e.g. FE.", parent=self)
+            return
+        try:
+            if float(self.entries['verify_interval'].get().strip() or 0) < 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("Invalid Interval", "Verify interval must be a number of seconds (0 = off).", parent=self)
+            return
         if not self.config_parser.has_section(self.port_name):
             self.config_parser.add_section(self.port_name)
         for key, entry in self.entries.items():
@@ -416,16 +928,16 @@ class ModuleEditDialog(Toplevel):
         with open(CONFIG_FILE, 'w') as configfile:
             self.config_parser.write(configfile)
         self.was_saved = True
-        self.on_dialog_close()
+        self.hide()
 
 if __name__ == "__main__":
-    try:
-        import serial
-        from PIL import Image, ImageTk
-    except ImportError as e:
-        if 'serial' in str(e): print("Error: 'pyserial' not installed. Please run: pip install pyserial")
-        elif 'PIL' in str(e): print("Error: 'Pillow' not installed. Please run: pip install Pillow")
+    import importlib.util
+    # pyserial is already imported by relayboard; Pillow is only looked up, not loaded.
+    if importlib.util.find_spec('PIL') is None:
+        print("Error: 'Pillow' not installed. Please run: pip install Pillow")
         sys.exit(1)
-        
-    app = App()
+    parser = argparse.ArgumentParser(description="16-channel USB relay board control panel.")
+    parser.add_argument('--profile-startup', action='store_true', help="print where startup time goes, then keep running")
+    opts = parser.parse_args()
+    app = App(profile_startup=opts.profile_startup)
     app.mainloop()
@@ -0,0 +1,141 @@
+# --- Serial port hotplug notifications ---
+# A source yields (action, device) pairs, action being ADD or REMOVE and device a port
+# path such as /dev/ttyUSB0 or COM3. HotplugWatcher runs a source on a daemon thread and
+# hands each event to a callback, which must be thread-safe (e.g. queue.put).
+# Sources, best first: udev over netlink (needs pyudev), inotify on /dev (Linux), and
+# polling comports() as the portable fallback. QueueSource lets tests inject events.
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import relayboard
+
+ADD = 'add'
+REMOVE = 'remove'
+POLL_INTERVAL = 2.0
+STOP_CHECK_INTERVAL = 0.5 # How often blocking sources look at the stop flag
+TTY_PREFIXES = ('ttyUSB', 'ttyACM', 'ttyCH341')
+
+
+class PollingSource:
+    # Diffs comports() every `interval` seconds. The first scan is the baseline, not events.
+    def __init__(self, interval=POLL_INTERVAL, list_devices=relayboard.available_devices):
+        self.interval = interval
+        self.list_devices = list_devices
+        self.stopped = threading.Event()
+    def events(self):
+        known = self.list_devices()
+        while not self.stopped.wait(self.interval):
+            current = self.list_devices()
+            for device in sorted(current - known): yield ADD, device
+            for device in sorted(known - current): yield REMOVE, device
+            known = current
+    def close(self):
+        self.stopped.set()
+
+
+class UdevSource:
+    # Kernel uevents for the tty subsystem, delivered by udev once the node is set up.
+    def __init__(self):
+        import pyudev
+        self.monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        self.monitor.filter_by('tty')
+        self.stopped = threading.Event()
+    def events(self):
+        self.monitor.start()
+        while not self.stopped.is_set():
+            device = self.monitor.poll(timeout=STOP_CHECK_INTERVAL)
+            if device is None or not device.device_node: continue
+            if device.action == 'add': yield ADD, device.device_node
+            elif device.action == 'remove': yield REMOVE, device.device_node
+    def close(self):
+        self.stopped.set()
+
+
+class InotifySource:
+    # Watches /dev for serial device nodes being created or deleted, without extra packages.
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    EVENT_HEADER = struct.Struct('iIII')
+    def __init__(self, directory='/dev', prefixes=TTY_PREFIXES):
+        self.directory = directory
+        self.prefixes = prefixes
+        # Imported here, off the startup path: ctypes.util alone pulls in subprocess, shutil and tempfile.
+        import ctypes
+        import ctypes.util
+        self.get_errno = ctypes.get_errno
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(self.get_errno(), "inotify_init1 failed")
+        if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.IN_CREATE | self.IN_DELETE) < 0:
+            errno = self.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        self.stopped = threading.Event()
+    def events(self):
+        try:
+            while not self.stopped.is_set():
+                if not select.select([self.fd], [], [], STOP_CHECK_INTERVAL)[0]: continue
+                yield from self.parse(os.read(self.fd, 4096))
+        finally:
+            os.close(self.fd)
+    def parse(self, data):
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            _, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if not name.startswith(self.prefixes): continue
+            device = os.path.join(self.directory, name)
+            if mask & self.IN_CREATE: yield ADD, device
+            elif mask & self.IN_DELETE: yield REMOVE, device
+    def close(self):
+        self.stopped.set()
+
+
+class QueueSource:
+    # Fake source for tests: push((action, device)) from any thread, close() to end.
+    def __init__(self):
+        self.pending = queue.SimpleQueue()
+    def push(self, action, device):
+        self.pending.put((action, device))
+    def events(self):
+        while (event := self.pending.get()) is not None:
+            yield event
+    def close(self):
+        self.pending.put(None)
+
+
+def default_source():
+    if sys.platform.startswith('linux'):
+        for source in (UdevSource, InotifySource):
+            try:
+                return source()
+            except (ImportError, OSError, AttributeError) as e:
+                print(f"Hotplug: {source.__name__} unavailable ({e}).")
+    return PollingSource()
+
+
+class HotplugWatcher(threading.Thread):
+    def __init__(self, callback, source=None):
+        super().__init__(name="hotplug", daemon=True)
+        self.callback = callback
+        self.source = source # Without one, the default is picked on the watcher thread (pyudev import, libc lookup)
+        self.closed = threading.Event()
+        self.start()
+    def run(self):
+        if not self.source: self.source = default_source()
+        if self.closed.is_set():
+            self.source.close()
+            return
+        for action, device in self.source.events():
+            self.callback(action, device)
+    def close(self, timeout=None):
+        self.closed.set()
+        if self.source: self.source.close()
+        self.join(timeout)
@@ -0,0 +1,87 @@
+# --- Icon decoding with a persistent thumbnail cache and a background loader ---
+# Resized icons are kept as PNGs in icons/.thumbs, named after a hash of the icon's file
+# name and target size plus its mtime and byte size. An edited icon therefore gets a new
+# entry, and the old one is deleted when it is written. Only Pillow is used here; Tk
+# PhotoImages are made from the results on the Tk thread (see gui.IconManager).
+# Pillow is imported on first use, normally on the loader thread, to keep it off startup.
+import hashlib
+import os
+import queue
+import threading
+
+THUMB_DIR = '.thumbs'
+ICON_EXTENSIONS = ('.png', '.gif', '.jpg', '.jpeg')
+
+
+def list_icons(icons_dir):
+    return sorted(f for f in os.listdir(icons_dir) if f.lower().endswith(ICON_EXTENSIONS))
+
+
+class ThumbnailCache:
+    def __init__(self, icons_dir):
+        self.icons_dir = icons_dir
+        self.cache_dir = os.path.join(icons_dir, THUMB_DIR)
+    def render(self, filename, size, fit=False):
+        # PIL image of the icon at size (fit=True keeps the aspect ratio inside size), or None if unreadable.
+        from PIL import Image
+        path = os.path.join(self.icons_dir, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = hashlib.sha1(f"{filename}|{size[0]}x{size[1]}|{int(fit)}".encode()).hexdigest()[:20]
+        cached = os.path.join(self.cache_dir, f"{key}-{st.st_mtime_ns:x}-{st.st_size:x}.png")
+        try:
+            with Image.open(cached) as img:
+                img.load()
+                return img
+        except OSError:
+            pass
+        try:
+            with Image.open(path) as img:
+                img = img.convert('RGBA')
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"Could not load icon: {filename}, Error: {e}")
+            return None
+        if fit:
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+        else:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        self.store(key, cached, img)
+        return img
+    def store(self, key, cached, img):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(key + '-'): os.remove(os.path.join(self.cache_dir, name))
+            temp = f"{cached}.{threading.get_ident()}.tmp" # Written aside so a reader never sees half a file
+            img.save(temp, 'PNG')
+            os.replace(temp, cached)
+        except OSError:
+            pass # Read-only icons folder: icons still load, just without the cache
+
+
+class IconLoader(threading.Thread):
+    # Decodes icons off the Tk thread. Requests are (key, filename, size, fit); finished
+    # (key, image) pairs are collected with done(), image being None for unreadable files.
+    def __init__(self, cache):
+        super().__init__(name="icon-loader", daemon=True)
+        self.cache = cache
+        self.requests = queue.SimpleQueue()
+        self.results = queue.SimpleQueue()
+        self.start()
+    def request(self, key, filename, size, fit=False):
+        self.requests.put((key, filename, size, fit))
+    def run(self):
+        while (request := self.requests.get()) is not None:
+            key, filename, size, fit = request
+            self.results.put((key, self.cache.render(filename, size, fit)))
+    def done(self):
+        done = []
+        while True:
+            try:
+                done.append(self.results.get_nowait())
+            except queue.Empty:
+                return done
+    def close(self):
+        self.requests.put(None)
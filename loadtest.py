@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# --- End-to-end load test of server.py against simulated boards (no hardware needed) ---
+# Starts FakeBoards on ptys, a RelayServer on a loopback port in a background thread, and
+# many keep-alive HTTP clients that set random relays. Reports requests/s and latency
+# percentiles; a WebSocket client checks that state changes are streamed.
+#   python3 loadtest.py --boards 4 --clients 50 --requests 2000
+import argparse
+import asyncio
+import base64
+import configparser
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+import fakeboard
+import relayboard
+from metrics import percentile
+import server
+
+
+def start_server(config_file, port):
+    # The server gets its own thread and loop so client load does not share its event loop.
+    ready = threading.Event()
+    state = {}
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        relay_server = server.RelayServer(relayboard.RelayController(config_file))
+        state['listener'] = loop.run_until_complete(relay_server.start('127.0.0.1', port))
+        state['loop'], state['server'] = loop, relay_server
+        ready.set()
+        loop.run_forever()
+        state['listener'].close()
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks: task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+        relay_server.close()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+    return state, thread
+
+
+async def http_request(reader, writer, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length': length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(port, sections, requests, latencies, statuses):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for _ in range(requests):
+            section = random.choice(sections)
+            relay = random.randint(1, 16)
+            started = time.perf_counter()
+            status, _ = await http_request(reader, writer, 'POST', f"/boards/{quote(section, safe='')}/relays/{relay}", {'on': random.random() < 0.5})
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def watch(port, messages, stop):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(f"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+    while (await reader.readline()) not in (b'\r\n', b''): pass
+    try:
+        while not stop.is_set():
+            opcode, payload = await asyncio.wait_for(server.ws_read(reader), 0.5)
+            if opcode == 0x1: messages.append(json.loads(payload))
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_load(port, sections, clients, requests):
+    latencies, statuses, messages = [], {}, []
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch(port, messages, stop))
+    per_client = max(1, requests // clients)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, sections, per_client, latencies, statuses) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.3)
+    stop.set()
+    await watcher
+    return latencies, statuses, messages, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the relay HTTP API against simulated boards.")
+    parser.add_argument('--boards', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000, help="total requests across all clients")
+    parser.add_argument('--baud', type=int, default=relayboard.BAUD_RATE, help="simulated line rate, 0 for instant replies")
+    parser.add_argument('--port', type=int, default=18765)
+    opts = parser.parse_args(argv)
+    boards = [fakeboard.FakeBoard(baud=opts.baud or None) for _ in range(opts.boards)]
+    config = configparser.ConfigParser()
+    for i, board in enumerate(boards):
+        config[board.device] = {'name': f"Fake {i + 1}"}
+    with tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False) as config_file:
+        config.write(config_file)
+    state, thread = start_server(config_file.name, opts.port)
+    try:
+        latencies, statuses, messages, elapsed = asyncio.run(run_load(opts.port, [b.device for b in boards], opts.clients, opts.requests))
+        pool = state['server'].pool
+        pool.wait_idle(5)
+        mismatched = [b.device for b in boards if b.mask != pool.boards[b.device].state.mask]
+    finally:
+        state['loop'].call_soon_threadsafe(state['loop'].stop)
+        thread.join(5)
+        for board in boards: board.close()
+        os.unlink(config_file.name)
+    latencies.sort()
+    print(f"{len(latencies)} requests from {opts.clients} clients to {opts.boards} boards in {elapsed:.2f}s")
+    print(f"throughput: {len(latencies) / elapsed:.0f} requests/s")
+    print(f"latency: p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p90 {percentile(latencies, 0.9) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print(f"statuses: {dict(sorted(statuses.items()))}")
+    print(f"websocket state messages: {len(messages)}")
+    if mismatched: print(f"state mismatch between server and board on: {', '.join(mismatched)}")
+    return 1 if mismatched or set(statuses) - {200} else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# --- Per-board counters and latency histograms for the serial path ---
+# Each RelayBoard owns a BoardMetrics that its SerialWorker updates as frames go out:
+# commands run, frames and bytes written, bytes read back, errors, time spent sleeping
+# for the frame gap, and histograms of write, reply and end-to-end command time.
+# snapshot() gives plain dicts; to_json / to_prometheus format {board: snapshot} for
+# relayctl.py --metrics, server.py /metrics and the GUI's Export Metrics.
+import bisect
+import json
+import threading
+
+# Upper bounds in seconds; a 17-byte frame is ~18 ms on the wire at 9600 baud.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+HISTOGRAMS = {
+    'write': "Time to write and flush one frame, after the frame gap",
+    'reply': "Time from the end of a write to the board's reply",
+    'command': "Time from queueing a command to its completion",
+}
+COUNTERS = {
+    'commands': "Commands run by the board's worker",
+    'frames': "Frames written to the port",
+    'bytes_written': "Bytes written to the port",
+    'bytes_read': "Reply bytes read from the port",
+    'coalesced': "Queued writes replaced by a newer write to the same relay",
+    'pacing_seconds': "Time spent waiting out the minimum frame gap",
+}
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1) # Last slot: above the largest bucket
+        self.sum = 0.0
+        self.count = 0
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+    def snapshot(self):
+        cumulative, total = [], 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.counts):
+            total += count
+            cumulative.append([bound, total])
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class BoardMetrics:
+    # Written by the board's worker thread, read from any thread through snapshot().
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.errors = {} # Exception class name -> count
+        self.histograms = {name: Histogram() for name in HISTOGRAMS}
+        self.queue_depth_max = 0
+    def add(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+    def frame_written(self, size, seconds):
+        with self.lock:
+            self.counters['frames'] += 1
+            self.counters['bytes_written'] += size
+            self.histograms['write'].observe(seconds)
+    def reply_read(self, size, seconds):
+        with self.lock:
+            self.counters['bytes_read'] += size
+            self.histograms['reply'].observe(seconds)
+    def command_done(self, seconds, error=None):
+        with self.lock:
+            self.counters['commands'] += 1
+            self.histograms['command'].observe(seconds)
+            if error: self.errors[type(error).__name__] = self.errors.get(type(error).__name__, 0) + 1
+    def queued(self, depth):
+        if depth > self.queue_depth_max: self.queue_depth_max = depth # Only a high-water mark, races are harmless
+    def snapshot(self, queue_depth=0):
+        with self.lock:
+            return {
+                **self.counters,
+                'errors': dict(self.errors),
+                'queue_depth': queue_depth,
+                'queue_depth_max': self.queue_depth_max,
+                'latency': {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            }
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list, for the load test and benchmark reports.
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def to_json(snapshots):
+    return json.dumps(snapshots, indent=2)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(snapshots):
+    # Prometheus text exposition format, one series per board labelled by its config section.
+    lines = []
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP relay_{name} {help_text}")
+        lines.append(f"# TYPE relay_{name} {kind}")
+        lines.extend(f"relay_{name}{suffix}{{{labels}}} {value}" for suffix, labels, value in samples)
+    boards = [(f'board="{escape(board)}",name="{escape(snap.get("name", board))}"', snap) for board, snap in snapshots.items()]
+    for counter, help_text in COUNTERS.items():
+        metric(f"{counter}_total", 'counter', help_text, [('', labels, snap[counter]) for labels, snap in boards])
+    metric('errors_total', 'counter', "Failed commands by exception type",
+           [('', f'{labels},type="{escape(kind)}"', count) for labels, snap in boards for kind, count in sorted(snap['errors'].items())])
+    metric('queue_depth', 'gauge', "Commands queued or on the wire", [('', labels, snap['queue_depth']) for labels, snap in boards])
+    metric('queue_depth_max', 'gauge', "Deepest the command queue has been", [('', labels, snap['queue_depth_max']) for labels, snap in boards])
+    for name, help_text in HISTOGRAMS.items():
+        samples = []
+        for labels, snap in boards:
+            histogram = snap['latency'][name]
+            samples.extend(('_bucket', f'{labels},le="{bound}"', count) for bound, count in histogram['buckets'])
+            samples.append(('_sum', labels, histogram['sum']))
+            samples.append(('_count', labels, histogram['count']))
+        metric(f"{name}_seconds", 'histogram', help_text, samples)
+    return '\n'.join(lines) + '\n'
+
@@ -0,0 +1,123 @@
+# --- ASCII-HEX (Modbus ASCII style) framing for the CH340 16-channel relay board ---
+# A frame is ':' + hex(address, function, payload...) + hex(LRC) + CR LF, all upper case.
+# The LRC is the two's complement of the byte sum, so summing every byte including it gives 0.
+
+DEFAULT_ADDRESS = 0xFE
+RELAY_COUNT = 16
+
+FUNC_READ_COILS = 0x01
+FUNC_WRITE_COIL = 0x05
+FUNC_WRITE_COILS = 0x0F
+EXCEPTION_FLAG = 0x80
+
+COIL_ON = 0xFF00
+COIL_OFF = 0x0000
+
+FRAME_START = b':'
+FRAME_END = b'\r\n'
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def lrc(data):
+    return -sum(data) & 0xFF
+
+
+def encode_frame(address, function, payload=b''):
+    body = bytes((address, function)) + bytes(payload)
+    return FRAME_START + (body + bytes((lrc(body),))).hex().upper().encode('ascii') + FRAME_END
+
+
+def decode_frame(raw):
+    # Returns (address, function, payload) from one complete frame, checking the LRC.
+    raw = bytes(raw).strip()
+    if not raw.startswith(FRAME_START):
+        raise ProtocolError(f"Frame does not start with ':': {raw!r}")
+    try:
+        body = bytes.fromhex(raw[1:].decode('ascii'))
+    except ValueError:
+        raise ProtocolError(f"Frame is not valid ASCII hex: {raw!r}") from None
+    if len(body) < 3:
+        raise ProtocolError(f"Frame too short: {raw!r}")
+    if sum(body) & 0xFF:
+        raise ProtocolError(f"Bad LRC in frame: {raw!r}")
+    return body[0], body[1], body[2:-1]
+
+
+def write_coil_frame(relay_index, state, address=DEFAULT_ADDRESS):
+    value = COIL_ON if state else COIL_OFF
+    return encode_frame(address, FUNC_WRITE_COIL, relay_index.to_bytes(2, 'big') + value.to_bytes(2, 'big'))
+
+
+def write_coils_frame(mask, count=RELAY_COUNT, address=DEFAULT_ADDRESS, start=0):
+    # One frame setting `count` relays from `start`; bit i of mask drives relay start + i.
+    data = (mask & ((1 << count) - 1)).to_bytes((count + 7) // 8, 'little')
+    return encode_frame(address, FUNC_WRITE_COILS, start.to_bytes(2, 'big') + count.to_bytes(2, 'big') + bytes((len(data),)) + data)
+
+
+def check_write_coils_reply(raw, count=RELAY_COUNT, address=DEFAULT_ADDRESS, start=0):
+    # The board acknowledges a multi-coil write by echoing start and count; anything else is a rejection.
+    reply_address, function, payload = decode_frame(raw)
+    if reply_address != address:
+        raise ProtocolError(f"Reply from address {reply_address:02X}, expected {address:02X}")
+    if function == FUNC_WRITE_COILS | EXCEPTION_FLAG:
+        raise ProtocolError(f"Board rejected multi-coil write (exception {payload.hex().upper()})")
+    if function != FUNC_WRITE_COILS or payload != start.to_bytes(2, 'big') + count.to_bytes(2, 'big'):
+        raise ProtocolError(f"Unexpected multi-coil write reply: {bytes(raw).strip()!r}")
+
+
+def is_reply(raw, address, function):
+    # True for a well-formed frame from address answering function, normally or with an exception.
+    try:
+        reply_address, reply_function, _ = decode_frame(raw)
+    except ProtocolError:
+        return False
+    return reply_address == address and reply_function & ~EXCEPTION_FLAG == function
+
+
+def read_coils_frame(count=RELAY_COUNT, address=DEFAULT_ADDRESS, start=0):
+    return encode_frame(address, FUNC_READ_COILS, start.to_bytes(2, 'big') + count.to_bytes(2, 'big'))
+
+
+def decode_coil_status(raw, count=RELAY_COUNT, address=DEFAULT_ADDRESS):
+    # Parses a read-coils reply into a bit mask where bit i is relay i + 1.
+    reply_address, function, payload = decode_frame(raw)
+    if reply_address != address:
+        raise ProtocolError(f"Reply from address {reply_address:02X}, expected {address:02X}")
+    if function != FUNC_READ_COILS:
+        raise ProtocolError(f"Unexpected function {function:02X} in status reply")
+    if not payload or payload[0] != len(payload) - 1:
+        raise ProtocolError(f"Malformed status payload: {payload.hex().upper()}")
+    return int.from_bytes(payload[1:], 'little') & ((1 << count) - 1)
+
+
+# --- Precomputed frame tables ---
+# Frames are immutable bytes built once per address, so hot paths only do a tuple lookup.
+_relay_tables = {}
+
+
+def relay_table(address=DEFAULT_ADDRESS):
+    # Returns (off_frames, on_frames), each a tuple indexed by relay.
+    table = _relay_tables.get(address)
+    if table is None:
+        table = _relay_tables[address] = tuple(
+            tuple(write_coil_frame(i, state, address) for i in range(RELAY_COUNT)) for state in (False, True))
+    return table
+
+
+def relay_frame(relay_index, state, address=DEFAULT_ADDRESS):
+    return relay_table(address)[bool(state)][relay_index]
+
+
+def parse_address(text, default=DEFAULT_ADDRESS):
+    # Board addresses are written in config.ini as hex, e.g. "FE".
+    if not text: return default
+    address = int(text, 16)
+    if not 0 <= address <= 0xFF:
+        raise ValueError(f"Board address out of range: {text}")
+    return address
+
+
+relay_table(DEFAULT_ADDRESS)
@@ -0,0 +1,604 @@
+# --- Headless relay board control (no tkinter / Pillow imports) ---
+# Shared by gui.py and relayctl.py. Port enumeration is imported lazily because
+# serial.tools.list_ports is only needed when discovering boards.
+import collections
+import configparser
+import queue
+import sys
+import threading
+import time
+from functools import partial
+import serial
+import protocol
+from metrics import BoardMetrics
+
+CONFIG_FILE = 'config.ini'
+BAUD_RATE = 9600
+CH340_HWID = '1A86:7523'
+COMMAND_QUEUE_SIZE = 64 # Bounded so a stuck port pushes back on the caller instead of growing forever
+MIN_FRAME_GAP = 0.02 # Idle time the board needs between frames, counted from the end of the previous write
+COALESCE_WINDOW = 0.0 # Extra time a single-relay write waits in the queue to absorb newer writes to that relay
+BULK_REPLY_TIMEOUT = 0.15 # Ack for a 17-byte echo takes ~18 ms on the wire at 9600 baud
+STATUS_REPLY_TIMEOUT = 0.2 # Query plus 15-byte reply is ~35 ms on the wire
+ALL_RELAYS = (1 << protocol.RELAY_COUNT) - 1
+RECONNECT_BACKOFF = 0.5 # First retry delay after a failed open; doubles per failure
+RECONNECT_BACKOFF_MAX = 30.0
+
+SerialException = serial.SerialException
+# pyserial does not wrap every OS call: flush() and reset_input_buffer() raise termios.error
+# (not an OSError) when the port has been unplugged or hung up.
+if sys.platform == 'win32':
+    PORT_ERRORS = (OSError,)
+else:
+    import termios
+    PORT_ERRORS = (OSError, termios.error)
+
+
+def list_ports():
+    import serial.tools.list_ports
+    return serial.tools.list_ports.comports()
+
+
+def available_devices():
+    return {p.device for p in list_ports()}
+
+
+def scene_names(config_parser):
+    # Scenes are per-board keys 'scene_<name> = <mask>' (or '<mask>/<select>'), e.g. scene_evening = 0x00FF.
+    return sorted({key[6:] for section in config_parser.sections() for key in config_parser[section] if key.startswith('scene_')})
+
+
+def scene_targets(config_parser, name):
+    # {section: (mask, select)} for every board that defines the scene.
+    targets = {}
+    for section in config_parser.sections():
+        text = config_parser.get(section, f'scene_{name}', fallback=None)
+        if text is None: continue
+        mask, _, select = text.partition('/')
+        targets[section] = (int(mask, 0), int(select, 0) if select else ALL_RELAYS)
+    return targets
+
+
+def relay_bits(relay_numbers):
+    # 1-based relay numbers -> bit mask.
+    mask = 0
+    for rn in relay_numbers:
+        if not 1 <= rn <= protocol.RELAY_COUNT:
+            raise ValueError(f"Relay number out of range: {rn}")
+        mask |= 1 << (rn - 1)
+    return mask
+
+
+class CommandQueue:
+    # Bounded FIFO for one board with last-writer-wins coalescing. A write tagged with
+    # key (e.g. one relay) replaces the newest queued write with the same key, unless a
+    # later entry touches the same relays, in which case replacing it would reorder them.
+    # Replaced entries keep their place and their callbacks, which run when it is written.
+    class Entry:
+        __slots__ = ('command', 'callbacks', 'key', 'touches', 'ready_at', 'queued_at')
+        def __init__(self, command, on_done, key, touches, ready_at, queued_at):
+            self.command = command
+            self.callbacks = [on_done] if on_done else []
+            self.key = key
+            self.touches = touches
+            self.ready_at = ready_at
+            self.queued_at = queued_at
+    def __init__(self, maxsize=COMMAND_QUEUE_SIZE, window=COALESCE_WINDOW):
+        self.maxsize = maxsize
+        self.window = window
+        self.entries = collections.deque()
+        self.closed = False
+        self.in_flight = 0
+        self.coalesced = 0
+        self.lock = threading.Condition()
+    def put(self, command, on_done=None, block=False, timeout=None, key=None, touches=ALL_RELAYS):
+        with self.lock:
+            if key is not None:
+                for entry in reversed(self.entries):
+                    if entry.key == key:
+                        entry.command = command
+                        if on_done: entry.callbacks.append(on_done)
+                        self.coalesced += 1
+                        return True
+                    if entry.touches & touches: break
+            if not self.lock.wait_for(lambda: len(self.entries) < self.maxsize or self.closed, timeout if block else 0) or self.closed:
+                return False # Full, or closed (possibly while waiting for space)
+            now = time.monotonic()
+            ready_at = now + self.window if key is not None else 0
+            self.entries.append(self.Entry(command, on_done, key, touches, ready_at, now))
+            self.lock.notify_all()
+            return True
+    def get(self):
+        # Blocks for the next entry that is due; None once closed and empty.
+        with self.lock:
+            while True:
+                if self.entries:
+                    wait = self.entries[0].ready_at - time.monotonic()
+                    if wait <= 0:
+                        self.in_flight = 1
+                        entry = self.entries.popleft()
+                        self.lock.notify_all()
+                        return entry
+                    self.lock.wait(wait)
+                elif self.closed:
+                    return None
+                else:
+                    self.lock.wait()
+    def task_done(self):
+        with self.lock:
+            self.in_flight = 0
+            self.lock.notify_all()
+    def wait_idle(self, timeout=None):
+        # True once every queued write has completed.
+        with self.lock:
+            return self.lock.wait_for(lambda: not self.entries and not self.in_flight, timeout)
+    def wait_for_space(self, timeout=None):
+        with self.lock:
+            return self.lock.wait_for(lambda: len(self.entries) < self.maxsize or self.closed, timeout)
+    def depth(self):
+        # Writes not yet completed, including the one on the wire.
+        with self.lock:
+            return len(self.entries) + self.in_flight
+    def free_slots(self):
+        with self.lock:
+            return self.maxsize - len(self.entries)
+    def empty(self):
+        with self.lock:
+            return not self.entries
+    def pending_touches(self):
+        # Relays that a queued (not yet written) entry will change.
+        with self.lock:
+            touches = 0
+            for entry in self.entries: touches |= entry.touches
+            return touches
+    def clear(self):
+        # Drops every queued entry and returns them.
+        with self.lock:
+            dropped = list(self.entries)
+            self.entries.clear()
+            self.lock.notify_all()
+            return dropped
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+
+
+class SerialWorker(threading.Thread):
+    # Owns all writes to one serial port so callers (e.g. the Tk thread) never block on I/O.
+    # Completions are handed back through `results` as (on_done, error) pairs.
+    # Frames are paced by min_gap measured from when the previous write (or reply) completed,
+    # so time already spent queueing or encoding counts towards the gap.
+    # Timings and byte counts go to `metrics` (see metrics.BoardMetrics).
+    def __init__(self, serial_port, maxsize=COMMAND_QUEUE_SIZE, min_gap=MIN_FRAME_GAP, window=COALESCE_WINDOW, metrics=None):
+        super().__init__(name=f"serial-{serial_port.port}", daemon=True)
+        self.serial_port = serial_port
+        self.commands = CommandQueue(maxsize, window)
+        self.metrics = metrics or BoardMetrics()
+        self.results = queue.SimpleQueue()
+        self.min_gap = min_gap
+        self.last_write_done = 0.0
+        self.notify = None # Optional callable run on this thread after each result is queued
+        self.bulk_supported = None # Unknown until the first multi-coil write is acked or rejected
+        self.start()
+    def submit(self, command, on_done=None, block=False, timeout=None, key=None, touches=ALL_RELAYS):
+        # command is a frame to write, or a callable run on the worker thread.
+        # key/touches allow coalescing, see CommandQueue.
+        accepted = self.commands.put(command, on_done, block, timeout, key, touches)
+        self.metrics.queued(self.commands.depth())
+        return accepted
+    def free_slots(self):
+        return self.commands.free_slots()
+    def depth(self):
+        return self.commands.depth()
+    def run(self):
+        try:
+            while (entry := self.commands.get()) is not None:
+                try:
+                    if callable(entry.command):
+                        entry.command()
+                    else:
+                        self.write_frame(entry.command)
+                    error = None
+                except Exception as e: # Any error belongs to this entry; letting it out would strand the queue
+                    error = e
+                self.metrics.command_done(time.monotonic() - entry.queued_at, error)
+                self.commands.task_done()
+                self.complete(entry.callbacks or [None], error)
+        finally:
+            # Normally only reached through close(). If the thread dies anyway, refuse further
+            # writes and fail the queued ones rather than leave their callers waiting.
+            self.commands.close()
+            self.commands.task_done()
+            self.fail_queued(f"{self.serial_port.port}: writer thread stopped")
+    def complete(self, callbacks, error):
+        for on_done in callbacks:
+            self.results.put((on_done, error))
+        if self.notify: self.notify()
+    def fail_queued(self, message):
+        for entry in self.commands.clear():
+            self.complete(entry.callbacks, serial.SerialException(message))
+    def port_call(self, method, *args):
+        # Runs a serial_port method, reporting OS-level failures as SerialException.
+        try:
+            return method(*args)
+        except serial.SerialException:
+            raise
+        except PORT_ERRORS as e:
+            raise serial.SerialException(f"{self.serial_port.port}: {e}") from e
+    def write_frame(self, frame):
+        wait = self.last_write_done + self.min_gap - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+            self.metrics.add('pacing_seconds', wait)
+        started = time.monotonic()
+        try:
+            self.port_call(self.serial_port.write, frame)
+            self.port_call(self.serial_port.flush) # Returns once the bytes have left the UART
+        finally:
+            self.last_write_done = time.monotonic()
+        self.metrics.frame_written(len(frame), self.last_write_done - started)
+    def transact(self, frame, timeout):
+        # Writes a frame and returns the board's reply to it (b'' if none came within timeout).
+        # Single-coil writes are echoed on the board's own schedule, so an echo can still
+        # arrive after the input buffer is cleared: lines that do not answer this frame's
+        # function (or are garbled) are skipped until the timeout runs out.
+        address, function, _ = protocol.decode_frame(frame)
+        self.port_call(self.serial_port.reset_input_buffer)
+        self.write_frame(frame)
+        previous_timeout = self.serial_port.timeout
+        written = self.last_write_done
+        deadline = written + timeout
+        reply, read = b'', 0
+        try:
+            while (remaining := deadline - time.monotonic()) > 0:
+                self.serial_port.timeout = remaining
+                line = self.port_call(self.serial_port.read_until, protocol.FRAME_END)
+                read += len(line)
+                if not line.endswith(protocol.FRAME_END): break # Timed out
+                if protocol.is_reply(line, address, function):
+                    reply = line
+                    break
+        finally:
+            self.serial_port.timeout = previous_timeout
+            self.last_write_done = time.monotonic() # The gap runs from the end of the reply
+        self.metrics.reply_read(read, self.last_write_done - written)
+        return reply
+    def read_coils(self, address):
+        # Status query; returns the relay bit mask or raises ProtocolError. Echoes of recent
+        # single-coil writes are skipped by transact(), so this is safe right after a toggle.
+        reply = self.transact(protocol.read_coils_frame(address=address), STATUS_REPLY_TIMEOUT)
+        if not reply:
+            raise protocol.ProtocolError(f"No reply to status query on {self.serial_port.port}")
+        return protocol.decode_coil_status(reply, address=address)
+    def write_mask(self, mask, select, address):
+        # One function-0F frame for the whole board; per-relay frames only if the board rejects it.
+        # Returns True when the bulk frame was accepted, i.e. all 16 relays now match mask.
+        # Only silence or an actual 0F reply that is not an ack (e.g. an exception) counts as a rejection.
+        if self.bulk_supported is not False:
+            try:
+                reply = self.transact(protocol.write_coils_frame(mask, address=address), BULK_REPLY_TIMEOUT)
+                if not reply:
+                    raise protocol.ProtocolError("no reply")
+                protocol.check_write_coils_reply(reply, address=address)
+                self.bulk_supported = True
+                return True
+            except protocol.ProtocolError as e:
+                print(f"Multi-coil write not accepted on {self.serial_port.port} ({e}); using per-relay frames.")
+                self.bulk_supported = False
+        self.write_relays(mask, select, address)
+        return False
+    def write_relays(self, mask, select, address):
+        # One single-coil frame per relay in select.
+        frames = protocol.relay_table(address)
+        for i in range(protocol.RELAY_COUNT):
+            if select >> i & 1:
+                self.write_frame(frames[mask >> i & 1][i])
+    def close(self, drain=True, timeout=None):
+        # drain=True lets every queued frame reach the board before the thread exits.
+        # Otherwise queued writes are dropped and their callbacks completed with an error.
+        if not drain: self.fail_queued(f"{self.serial_port.port} closed before the write was sent")
+        self.commands.close()
+        self.join(timeout)
+
+
+class RelayState:
+    # Shadow copy of one board's relays; bit i is relay i + 1. This, not the UI, is the
+    # record of what the board is doing. `target` is what has been queued, `mask` what has
+    # actually been written, and `known` is False until all 16 relays have been set (or read).
+    __slots__ = ('mask', 'target', 'known')
+    def __init__(self):
+        self.reset()
+    def reset(self):
+        self.mask = 0
+        self.target = 0
+        self.known = False
+    def is_on(self, relay_index):
+        return bool(self.mask >> relay_index & 1)
+    def target_is_on(self, relay_index):
+        return bool(self.target >> relay_index & 1)
+
+
+class RelayBoard:
+    # One physical board: its serial handle, its writer thread and its Modbus address.
+    # Every write is queued; pass block=True to wait for queue space instead of failing.
+    def __init__(self, port, address=protocol.DEFAULT_ADDRESS, name=None, min_gap=MIN_FRAME_GAP, coalesce_window=COALESCE_WINDOW):
+        self.port = port
+        self.address = address
+        self.name = name or port
+        self.min_gap = min_gap
+        self.coalesce_window = coalesce_window
+        self.serial_port = None
+        self.worker = None
+        self.state = RelayState()
+        self.notify = None # Passed to the worker, e.g. to wake an event loop when writes complete
+        self.last_drift = None # (expected, actual) from the most recent verify() that found a mismatch
+        self.metrics = BoardMetrics() # Kept across reopens; ConnectionPool keeps it per section
+        self.state_lock = threading.Lock() # Guards state.target/known against concurrent apply() calls
+    @classmethod
+    def from_config(cls, config_parser, section, port=None):
+        # Optional per-board timing: 'min_frame_gap' and 'coalesce_window', in seconds.
+        address = protocol.parse_address(config_parser.get(section, 'address', fallback=None))
+        min_gap = float(config_parser.get(section, 'min_frame_gap', fallback='') or MIN_FRAME_GAP)
+        window = float(config_parser.get(section, 'coalesce_window', fallback='') or COALESCE_WINDOW)
+        return cls(port or section, address, config_parser.get(section, 'name', fallback=section), min_gap, window)
+    @property
+    def is_open(self):
+        return bool(self.worker and not self.worker.commands.closed and self.serial_port and self.serial_port.is_open)
+    def open(self):
+        self.serial_port = serial.Serial(self.port, BAUD_RATE, timeout=1)
+        self.worker = SerialWorker(self.serial_port, min_gap=self.min_gap, window=self.coalesce_window, metrics=self.metrics)
+        self.worker.notify = self.notify
+        self.state.reset() # Opening resets the CH340, so nothing is known about the relays yet
+        return self
+    def close(self, drain=True):
+        # Returns the (on_done, error) pairs that completed but were not yet collected.
+        done = []
+        if self.worker:
+            self.worker.close(drain=drain)
+            done = self.completed()
+            self.metrics.add('coalesced', self.worker.commands.coalesced)
+            self.worker = None
+        if self.serial_port and self.serial_port.is_open: self.serial_port.close()
+        self.serial_port = None
+        return done
+    def __enter__(self):
+        return self.open()
+    def __exit__(self, *exc_info):
+        self.close(drain=True)
+    def submit(self, command, on_done=None, block=False, key=None, touches=ALL_RELAYS):
+        if not self.is_open:
+            raise SerialException(f"{self.port} is not open")
+        return self.worker.submit(command, on_done, block, key=key, touches=touches)
+    def queue_depth(self):
+        return self.worker.depth() if self.worker else 0
+    def metrics_snapshot(self):
+        snapshot = self.metrics.snapshot(self.queue_depth())
+        if self.worker: snapshot['coalesced'] += self.worker.commands.coalesced # Folded into metrics on close
+        return dict(snapshot, name=self.name, port=self.port)
+    def wait_idle(self, timeout=None):
+        return self.worker.commands.wait_idle(timeout) if self.worker else True
+    def set_relay(self, relay_index, state, on_done=None, block=False):
+        bit = 1 << relay_index
+        return self.apply(bit if state else 0, bit, on_done, block)
+    def set_relays(self, mask, select=ALL_RELAYS, on_done=None, block=False):
+        return self.apply(mask, select, on_done, block)
+    def apply(self, mask, select=ALL_RELAYS, on_done=None, block=False):
+        # Moves the relays in select to the matching bits of mask, sending only what differs
+        # from the queued target: nothing, one single-coil frame, or one multi-coil frame.
+        # A 0F frame rewrites all 16 relays, so it is only used once the full state is known.
+        # Safe from several threads at once (e.g. the UI and a SequenceRun): the diff, the queueing
+        # and the target update happen under state_lock. A full queue is waited on outside the
+        # lock, since the worker needs it in sync_state to make room.
+        while True:
+            with self.state_lock:
+                accepted = self.queue_changes(mask, select, on_done)
+            if accepted or not block: return accepted
+            worker = self.worker
+            if worker: worker.commands.wait_for_space() # Closed meanwhile: the next pass raises
+    def queue_changes(self, mask, select, on_done):
+        if not self.is_open:
+            raise SerialException(f"{self.port} is not open")
+        state = self.state
+        select &= ALL_RELAYS
+        target = state.target & ~select | mask & select
+        changed = (target ^ state.target) & select if state.known else select
+        if not changed:
+            self.worker.results.put((on_done, None)) # No-op: complete without touching the port
+            if self.worker.notify: self.worker.notify()
+            return True
+        if changed & (changed - 1) == 0:
+            # Single relay: replaces a still-queued write to the same relay (last writer wins).
+            relay_index = changed.bit_length() - 1
+            accepted = self.worker.submit(partial(self.write_relay, relay_index, bool(target & changed)), on_done, key=relay_index, touches=changed)
+        elif state.known or select == ALL_RELAYS:
+            accepted = self.worker.submit(partial(self.write_mask, target, changed), on_done)
+        else:
+            accepted = self.worker.submit(partial(self.write_relays, target, changed), on_done, touches=changed)
+        if not accepted:
+            return False
+        state.target = target
+        if select == ALL_RELAYS: state.known = True
+        return True
+    # Run on the worker thread; state.mask is only updated once the write has gone out.
+    def write_relay(self, relay_index, on):
+        if self.state.known and self.state.is_on(relay_index) == on: return # Coalesced back to where it was
+        self.worker.write_frame(protocol.relay_frame(relay_index, on, self.address))
+        self.state.mask = self.state.mask | 1 << relay_index if on else self.state.mask & ~(1 << relay_index)
+    def write_mask(self, mask, select):
+        if self.worker.write_mask(mask, select, self.address):
+            self.state.mask = mask
+        else:
+            self.state.mask = self.state.mask & ~select | mask & select
+    def write_relays(self, mask, select):
+        self.worker.write_relays(mask, select, self.address)
+        self.state.mask = self.state.mask & ~select | mask & select
+    def read_state(self, on_done=None, block=False):
+        # Queries the board and adopts its answer as the state model, switching nothing.
+        return self.submit(self.sync_state, on_done, block, touches=0)
+    def verify(self, on_done=None, block=False):
+        # Like read_state, but records a mismatch with the model in last_drift first.
+        return self.submit(partial(self.sync_state, True), on_done, block, touches=0)
+    def sync_state(self, check_drift=False):
+        actual = self.worker.read_coils(self.address)
+        state = self.state
+        if check_drift and state.known and actual != state.mask:
+            self.last_drift = (state.mask, actual)
+        with self.state_lock: # No apply() may diff against the old target in between
+            # Relays with a write queued behind us keep their queued target; the rest adopt the board's.
+            pending = self.worker.commands.pending_touches()
+            state.mask = actual
+            state.target = actual & ~pending | state.target & pending
+            state.known = True
+    def all_on(self, on_done=None, block=False):
+        return self.apply(ALL_RELAYS, on_done=on_done, block=block)
+    def all_off(self, on_done=None, block=False):
+        return self.apply(0, on_done=on_done, block=block)
+    def completed(self):
+        # Drains finished writes as (on_done, error) pairs without blocking.
+        done = []
+        while self.worker:
+            try:
+                done.append(self.worker.results.get_nowait())
+            except queue.Empty:
+                break
+        return done
+
+
+class RelayController:
+    # Boards as configured in config.ini, looked up by section (port), nickname or port path.
+    # For several boards at once, open_all() fills a ConnectionPool with every present board.
+    def __init__(self, config_file=CONFIG_FILE):
+        self.config_file = config_file
+        self.config_parser = configparser.ConfigParser()
+        self.config_parser.read(config_file)
+        self.pool = None
+    def sections(self):
+        return self.config_parser.sections()
+    def find_section(self, key):
+        if self.config_parser.has_section(key): return key
+        for section in self.config_parser.sections():
+            if self.config_parser.get(section, 'name', fallback=None) == key: return section
+        return None
+    def board(self, key):
+        section = self.find_section(key)
+        if not section: return RelayBoard(key) # Unconfigured port path: default address
+        import discovery
+        port = discovery.DeviceIndex().refresh().resolve(section)
+        if not port:
+            raise SerialException(f"{section}: board is not connected")
+        return RelayBoard.from_config(self.config_parser, section, port)
+    def open_all(self, group=None, notify=None):
+        import discovery
+        self.pool = ConnectionPool(self.config_parser, discovery.DeviceIndex().refresh().resolve)
+        self.pool.notify = notify
+        return self.pool.open_all(self.pool.group_sections(group))
+    def close(self, drain=True):
+        return self.pool.close_all(drain) if self.pool else {}
+
+
+class ConnectionPool:
+    # Keeps one open RelayBoard per configured board so switching views costs no I/O
+    # (every open resets the CH340). Failed opens are retried lazily with exponential backoff.
+    # resolve maps a config section to its current device node (see discovery.DeviceIndex).
+    def __init__(self, config_parser, resolve=lambda section: section):
+        self.config_parser = config_parser
+        self.resolve = resolve
+        self.notify = None # Handed to every board it creates (see RelayBoard.notify)
+        self.boards = {}
+        self.metrics = {} # section -> BoardMetrics, outliving discarded handles
+        self.failures = {}
+        self.retry_at = {}
+    def get(self, section):
+        # Returns an open board, reusing the existing handle. Raises SerialException while backing off.
+        port = self.resolve(section)
+        if not port:
+            raise SerialException(f"{section}: board is not connected")
+        board = self.boards.get(section)
+        if board is None:
+            board = self.boards[section] = RelayBoard.from_config(self.config_parser, section, port)
+            board.notify = self.notify
+            board.metrics = self.metrics.setdefault(section, board.metrics)
+        else:
+            board.address = protocol.parse_address(self.config_parser.get(section, 'address', fallback=None))
+            board.name = self.config_parser.get(section, 'name', fallback=section)
+            if board.port != port: # Renumbered by the kernel: same board, new node
+                board.close(drain=False)
+                board.port = port
+        if board.is_open: return board
+        wait = self.retry_at.get(section, 0) - time.monotonic()
+        if wait > 0:
+            raise SerialException(f"{section}: reconnecting in {wait:.1f}s")
+        try:
+            board.open()
+        except SerialException:
+            self.mark_failed(section)
+            raise
+        self.failures.pop(section, None)
+        self.retry_at.pop(section, None)
+        return board
+    def mark_failed(self, section):
+        # Returns the (on_done, error) pairs the closed handle still held, queued writes included.
+        board = self.boards.get(section)
+        done = board.close(drain=False) if board else []
+        failures = self.failures[section] = self.failures.get(section, 0) + 1
+        self.retry_at[section] = time.monotonic() + min(RECONNECT_BACKOFF * 2 ** (failures - 1), RECONNECT_BACKOFF_MAX)
+        return done
+    def retry_delay(self, section):
+        return max(0.0, self.retry_at.get(section, 0) - time.monotonic())
+    def discard(self, section):
+        # Device gone (unplugged or unconfigured): drop the handle without waiting on queued writes.
+        board = self.boards.pop(section, None)
+        if board: board.close(drain=False)
+        self.failures.pop(section, None)
+        self.retry_at.pop(section, None)
+    def open_all(self, sections=None):
+        # Opens every configured (or given) board that is present; returns {section: error} for the rest.
+        failed = {}
+        for section in self.config_parser.sections() if sections is None else sections:
+            try:
+                self.get(section)
+            except (SerialException, ValueError) as e:
+                failed[section] = e
+        return failed
+    def group_sections(self, group=None):
+        # Boards are grouped by an optional 'group' key in their section; None means every board.
+        return [s for s in self.config_parser.sections()
+                if group is None or self.config_parser.get(s, 'group', fallback='') == group]
+    def groups(self):
+        return sorted({self.config_parser.get(s, 'group', fallback='') for s in self.config_parser.sections()} - {''})
+    def apply_group(self, mask, select=ALL_RELAYS, group=None, on_done=None, block=False):
+        # Queues the same target on every open board in the group. Each board has its own
+        # worker thread, so the writes go out in parallel and take as long as one board.
+        accepted = {}
+        for section in self.group_sections(group):
+            board = self.boards.get(section)
+            if board and board.is_open:
+                accepted[section] = board.apply(mask, select, on_done, block)
+        return accepted
+    def wait_idle(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for board in self.open_boards():
+            if not board.wait_idle(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                return False
+        return True
+    def discard_device(self, device):
+        for section in [s for s, board in self.boards.items() if board.port == device]:
+            self.discard(section)
+    def open_boards(self):
+        return [board for board in self.boards.values() if board.is_open]
+    def metrics_snapshot(self):
+        # {section: snapshot} for every board opened so far, connected or not (see metrics.py).
+        snapshots = {}
+        for section, board_metrics in self.metrics.items():
+            board = self.boards.get(section)
+            if board: snapshots[section] = board.metrics_snapshot()
+            else: snapshots[section] = dict(board_metrics.snapshot(), name=self.config_parser.get(section, 'name', fallback=section))
+        return snapshots
+    def close_all(self, drain=True):
+        # Returns {section: [errors]} for writes that failed while draining.
+        errors = {}
+        for section, board in self.boards.items():
+            errors[section] = [error for _, error in board.close(drain=drain) if error]
+        self.boards.clear()
+        return errors
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# --- Command-line relay control, usable from cron and on headless servers ---
+#   relayctl.py list
+#   relayctl.py <board> on 3 5 7
+#   relayctl.py <board> off 3
+#   relayctl.py <board> pattern 0xFF00
+#   relayctl.py <board> all-on | all-off
+#   relayctl.py <board> status
+#   relayctl.py <board> scene evening   (scene_evening = <mask>[/<select>] in the board's section)
+#   relayctl.py <board> run powerup     (sequence_powerup = 0 on 1; 500 on 2; ..., see sequencer.py)
+#   relayctl.py all all-off          (every configured board, in parallel)
+#   relayctl.py @rack1 pattern 0x00FF (boards with 'group = rack1')
+#   relayctl.py --metrics prometheus --metrics-file relays.prom all all-off   (see metrics.py)
+# <board> is a config.ini section (USB identity), a module nickname or a port path such as /dev/ttyUSB0.
+import argparse
+import os
+import sys
+import discovery
+import metrics
+import protocol
+import relayboard
+import sequencer
+
+
+def parse_mask(text):
+    mask = int(text, 0)
+    if not 0 <= mask <= relayboard.ALL_RELAYS:
+        raise argparse.ArgumentTypeError(f"pattern must be between 0x0000 and 0xFFFF: {text}")
+    return mask
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='relayctl', description="Control CH340 16-channel USB relay boards.")
+    parser.add_argument('--config', default=relayboard.CONFIG_FILE, help="configuration file (default: %(default)s)")
+    parser.add_argument('--metrics', choices=['json', 'prometheus'], help="print serial-path metrics of the boards used")
+    parser.add_argument('--metrics-file', help="write the metrics to this file instead (default format: prometheus)")
+    parser.add_argument('board', help="config section, module nickname, serial port, 'all', '@group' or 'list'")
+    parser.add_argument('action', nargs='?', choices=['on', 'off', 'pattern', 'all-on', 'all-off', 'status', 'scene', 'run'])
+    parser.add_argument('args', nargs='*', help="relay numbers (1-16) for on/off, a bit mask for pattern, a name for scene/run")
+    return parser
+
+
+def list_boards(controller):
+    configured = controller.sections()
+    index = discovery.DeviceIndex().refresh()
+    for port in index.boards():
+        section = index.section_for(port, configured)
+        if section in configured:
+            name = controller.config_parser.get(section, 'name', fallback=port.device)
+            print(f"{port.device}\t{section}\t{name}\t[Configured]")
+        else:
+            print(f"{port.device}\t{section}\t{port.description}\t[New]")
+    return 0
+
+
+def load_steps(config_parser, section, action, name):
+    if section is None:
+        raise ValueError("scenes and sequences need a configured board")
+    if action == 'scene': return sequencer.load_scene(config_parser, section, name)
+    return sequencer.load_sequence(config_parser, section, name)
+
+
+def run(board, action, args, name=None):
+    # Returns the SequenceRun for 'run' (args are its steps); everything else is just queued.
+    if action == 'run':
+        sequence = sequencer.SequenceRun(board, args, name)
+        sequence.start()
+        return sequence
+    if action == 'scene':
+        _, mask, select = args[0]
+        board.apply(mask, select, block=True)
+    elif action in ('on', 'off'):
+        relays = relayboard.relay_bits(args)
+        board.apply(relays if action == 'on' else 0, relays, block=True)
+    elif action == 'pattern':
+        board.set_relays(args, block=True)
+    elif action == 'status':
+        board.read_state(block=True)
+    elif action == 'all-on':
+        board.all_on(block=True)
+    else:
+        board.all_off(block=True)
+    return None
+
+
+def wait_runs(runs):
+    # Ctrl+C cancels the remaining steps; what has switched stays switched.
+    try:
+        for sequence in runs: sequence.wait()
+    except KeyboardInterrupt:
+        for sequence in runs: sequence.cancel()
+        for sequence in runs: sequence.wait()
+    for sequence in runs:
+        print(sequence.report())
+
+
+def write_metrics(opts, snapshots):
+    if not (opts.metrics or opts.metrics_file): return
+    text = metrics.to_json(snapshots) + '\n' if opts.metrics == 'json' else metrics.to_prometheus(snapshots)
+    if not opts.metrics_file:
+        sys.stdout.write(text)
+        return
+    temp = f"{opts.metrics_file}.tmp" # Replaced in one step so a collector never reads half a file
+    with open(temp, 'w') as f: f.write(text)
+    os.replace(temp, opts.metrics_file)
+
+
+def print_status(label, board):
+    on = [str(i + 1) for i in range(protocol.RELAY_COUNT) if board.state.is_on(i)]
+    print(f"{label}0x{board.state.mask:04X}\ton: {' '.join(on) or '-'}")
+
+
+def run_group(controller, group, action, args, opts):
+    # Every board gets its commands queued first, then all drain together on their own threads.
+    failed = controller.open_all(group)
+    if not controller.pool.group_sections(group):
+        if group is None: print(f"Error: no boards configured in {controller.config_file}", file=sys.stderr)
+        else: print(f"Error: unknown or empty group '{group}' (groups: {', '.join(controller.pool.groups()) or 'none'})", file=sys.stderr)
+        return 1
+    for section, error in failed.items():
+        print(f"Error: {section}: {error}", file=sys.stderr)
+    boards = {section: board for section, board in controller.pool.boards.items() if section not in failed} # The pool also holds boards whose open() failed
+    if not boards:
+        print("Error: no configured boards are connected", file=sys.stderr)
+        return 1
+    runs = []
+    try:
+        for section, board in list(boards.items()):
+            if action in ('scene', 'run'):
+                try:
+                    steps = load_steps(controller.config_parser, section, action, args)
+                except ValueError as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    failed[section] = e
+                    del boards[section]
+                    continue
+                sequence = run(board, action, steps, args)
+            else:
+                sequence = run(board, action, args)
+            if sequence: runs.append(sequence)
+        wait_runs(runs)
+    finally:
+        errors = controller.close(drain=True)
+    for section, board in boards.items():
+        for error in errors.get(section, []):
+            print(f"Error: {section}: {error}", file=sys.stderr)
+        if action == 'status' and not errors.get(section):
+            print_status(f"{board.name}\t", board)
+    write_metrics(opts, controller.pool.metrics_snapshot())
+    return 1 if failed or any(errors.values()) else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    opts = parser.parse_args(argv)
+    controller = relayboard.RelayController(opts.config)
+    if opts.board == 'list':
+        return list_boards(controller)
+    if not opts.action:
+        parser.error("an action is required")
+    if opts.action in ('on', 'off') and not opts.args:
+        parser.error(f"'{opts.action}' needs at least one relay number")
+    try:
+        if opts.action in ('on', 'off'):
+            args = [int(a) for a in opts.args]
+            relayboard.relay_bits(args)
+        elif opts.action == 'pattern':
+            if len(opts.args) != 1: parser.error("'pattern' takes exactly one mask, e.g. 0xFF00")
+            args = parse_mask(opts.args[0])
+        elif opts.action in ('scene', 'run'):
+            if len(opts.args) != 1: parser.error(f"'{opts.action}' takes exactly one name")
+            args = opts.args[0]
+        else:
+            args = None
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+    if opts.board == 'all' or opts.board.startswith('@'):
+        return run_group(controller, opts.board[1:] if opts.board.startswith('@') else None, opts.action, args, opts)
+    try:
+        if opts.action in ('scene', 'run'):
+            args = load_steps(controller.config_parser, controller.find_section(opts.board), opts.action, args)
+        board = controller.board(opts.board).open()
+    except (relayboard.SerialException, ValueError) as e:
+        print(f"Error: {opts.board}: {e}", file=sys.stderr)
+        return 1
+    try:
+        sequence = run(board, opts.action, args, opts.args[0] if opts.args else None)
+        if sequence: wait_runs([sequence])
+    finally:
+        errors = [error for _, error in board.close(drain=True) if error]
+    for error in errors:
+        print(f"Error: {board.port}: {error}", file=sys.stderr)
+    if opts.action == 'status' and not errors:
+        print_status('', board)
+    write_metrics(opts, {controller.find_section(opts.board) or board.port: board.metrics_snapshot()})
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
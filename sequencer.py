@@ -0,0 +1,127 @@
+# --- Timed relay sequences (staggered power-up, pulses), played off the UI thread ---
+# A sequence is a per-board key in config.ini, one step per ';', each starting with its
+# offset in milliseconds from the start of the run:
+#   sequence_powerup = 0 on 1; 500 on 2; 1000 on 3
+#   sequence_pulse4 = 0 on 4; 200 off 4
+#   sequence_night = 0 scene evening; 1500 pattern 0x0000/0x000F; 3000 all-off
+# Offsets are absolute on the monotonic clock, so a late step does not push back the ones
+# after it. Each step is queued ahead of time by the board's measured write latency
+# (queue wait + frame time), and the time its frame actually left is kept as drift.
+import threading
+import time
+from functools import partial
+import relayboard
+
+FRAME_TIME = 17 * 10 / relayboard.BAUD_RATE # One single-coil frame on the wire (8N1), the first latency estimate
+MAX_LEAD = 0.25 # Never queue a step further ahead of its time than this
+LEAD_SMOOTHING = 0.3 # Weight of the newest latency sample in the running estimate
+STATE_READ_TIMEOUT = 1.0 # Longest wait for the initial relay read before the schedule starts
+
+
+def sequence_names(config_parser, section):
+    return sorted(key[9:] for key in config_parser[section] if key.startswith('sequence_'))
+
+
+def board_scene_names(config_parser, section):
+    return sorted(key[6:] for key in config_parser[section] if key.startswith('scene_'))
+
+
+def load_scene(config_parser, section, name):
+    # A scene as a one-step sequence: [(0, mask, select)].
+    target = relayboard.scene_targets(config_parser, name).get(section)
+    if target is None:
+        raise ValueError(f"{section} has no scene '{name}'")
+    return [(0.0,) + target]
+
+
+def parse_step(text, config_parser=None, section=None):
+    # '<ms> on|off <relays...>', '<ms> pattern <mask>[/<select>]', '<ms> all-on|all-off' or '<ms> scene <name>'
+    # -> (offset_seconds, mask, select)
+    words = text.split()
+    if len(words) < 2 or not words[0].isdigit():
+        raise ValueError(f"Sequence step must start with an offset in ms and an action: '{text.strip()}'")
+    offset, action, args = int(words[0]) / 1000, words[1], words[2:]
+    if action in ('on', 'off') and args:
+        bits = relayboard.relay_bits(int(a) for a in args)
+        return offset, bits if action == 'on' else 0, bits
+    if action in ('all-on', 'all-off') and not args:
+        return offset, relayboard.ALL_RELAYS if action == 'all-on' else 0, relayboard.ALL_RELAYS
+    if action == 'pattern' and len(args) == 1:
+        mask, _, select = args[0].partition('/')
+        return offset, int(mask, 0) & relayboard.ALL_RELAYS, int(select, 0) if select else relayboard.ALL_RELAYS
+    if action == 'scene' and len(args) == 1 and config_parser is not None:
+        return (offset,) + load_scene(config_parser, section, args[0])[0][1:]
+    raise ValueError(f"Unknown sequence step: '{text.strip()}'")
+
+
+def load_sequence(config_parser, section, name):
+    text = config_parser.get(section, f'sequence_{name}', fallback=None)
+    if text is None:
+        raise ValueError(f"{section} has no sequence '{name}'")
+    steps = [parse_step(step, config_parser, section) for step in text.split(';') if step.strip()]
+    return sorted(steps, key=lambda step: step[0]) # Stable: steps at the same offset keep their order
+
+
+class SequenceRun(threading.Thread):
+    # Plays [(offset, mask, select)] on one board. Writes go through the board's queue like
+    # any other, so on_step/on_finish are handed back with its other completions (e.g. run
+    # on the Tk thread). cancel() stops before the next step; relays already switched, and
+    # a step already queued ahead of its time, stay as they are.
+    # drift holds (offset, seconds late) per written step, negative if early, or
+    # (offset, None) for a step the full command queue refused.
+    def __init__(self, board, steps, name='sequence', on_step=None, on_finish=None):
+        super().__init__(name=f"sequence-{name}-{board.port}", daemon=True)
+        self.board = board
+        self.steps = steps
+        self.sequence_name = name
+        self.on_step = on_step
+        self.on_finish = on_finish
+        self.lead = FRAME_TIME
+        self.drift = []
+        self.error = None
+        self.cancelled = threading.Event()
+    def run(self):
+        board = self.board
+        try:
+            if not board.state.known:
+                # Read the relays first so multi-relay steps go out as one frame, not one per relay.
+                board.read_state(block=True)
+                board.wait_idle(STATE_READ_TIMEOUT)
+            start = time.monotonic() + self.lead # Room to queue step 0 ahead of its time as well
+            for offset, mask, select in self.steps:
+                due = start + offset
+                if self.cancelled.wait(max(0.0, due - self.lead - time.monotonic())): break
+                submitted = time.monotonic()
+                if self.cancelled.is_set(): break # cancel() may have come in since the wait returned
+                if not board.apply(mask, select, self.on_step):
+                    self.drift.append((offset, None))
+                    continue
+                # Runs on the worker right after the step's frames have gone out.
+                board.submit(partial(self.written, offset, due, submitted), block=True)
+        except relayboard.SerialException as e:
+            self.error = e
+        if self.on_finish:
+            try:
+                board.submit(lambda: None, self.on_finish, block=True)
+            except relayboard.SerialException:
+                pass
+    def written(self, offset, due, submitted):
+        done = time.monotonic()
+        self.drift.append((offset, done - due))
+        self.lead = min(MAX_LEAD, self.lead + LEAD_SMOOTHING * (done - submitted - self.lead))
+    def cancel(self):
+        self.cancelled.set()
+    def wait(self, timeout=None):
+        # True once the run has ended and every step it queued has been written.
+        self.join(timeout)
+        return not self.is_alive() and self.board.wait_idle(timeout)
+    def report(self):
+        late = [d for _, d in self.drift if d is not None]
+        text = f"{self.sequence_name} on {self.board.name}: {len(late)}/{len(self.steps)} steps"
+        if self.cancelled.is_set(): text += " (cancelled)"
+        if late:
+            worst = max(late, key=abs)
+            text += f", drift mean {sum(late) / len(late) * 1000:+.1f} ms, worst {worst * 1000:+.1f} ms"
+        if len(late) < len(self.drift): text += f", {len(self.drift) - len(late)} refused (queue full)"
+        if self.error: text += f", stopped: {self.error}"
+        return text
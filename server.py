@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# --- Local HTTP / WebSocket control API (asyncio, standard library only) ---
+#   GET  /boards                        every configured board with its state
+#   GET  /boards/<board>                one board
+#   POST /boards/<board>/relays/<n>     {"on": true|false}, or no body to toggle relay n (1-16)
+#   POST /boards/<board>/mask           {"mask": "0xFF00", "select": "0xFFFF"} (select optional)
+#   GET  /scenes                        scene names from config.ini
+#   POST /scenes/<name>                 apply 'scene_<name>' on every board that defines it
+#   GET  /ws                            WebSocket: a JSON state message per board on every change
+#   GET  /metrics                       serial-path metrics per board, Prometheus text (/metrics.json: JSON)
+# <board> is a config section or nickname, URL-encoded (e.g. %2Fdev%2FttyUSB0).
+# Requests only queue writes on the board's worker thread and await their completion, so
+# slow serial links never block the event loop. A full queue answers 503 instead of waiting.
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import sys
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+import metrics
+import protocol
+import relayboard
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+WRITE_TIMEOUT = 10.0 # Seconds a request waits for its write before answering 504
+CLIENT_QUEUE_SIZE = 64 # State messages buffered per WebSocket client; older ones are dropped
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_int(value, what):
+    try:
+        return int(value, 0) if isinstance(value, str) else int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{what} must be an integer") from None
+
+
+def ws_frame(payload, opcode=0x1):
+    header = bytes((0x80 | opcode,))
+    if len(payload) < 126: header += bytes((len(payload),))
+    elif len(payload) < 1 << 16: header += bytes((126,)) + struct.pack('!H', len(payload))
+    else: header += bytes((127,)) + struct.pack('!Q', len(payload))
+    return header + payload
+
+
+async def ws_read(reader):
+    # Returns (opcode, payload) of the next client frame; client frames are always masked.
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126: length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127: length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    key = await reader.readexactly(4) if second & 0x80 else b'\0\0\0\0'
+    data = await reader.readexactly(length)
+    return first & 0x0F, bytes(b ^ key[i % 4] for i, b in enumerate(data))
+
+
+class RelayServer:
+    def __init__(self, controller):
+        self.controller = controller
+        self.config_parser = controller.config_parser
+        self.loop = None
+        self.clients = set()
+        self.last_sent = {}
+    @property
+    def pool(self):
+        return self.controller.pool
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.loop = asyncio.get_running_loop()
+        # Worker threads wake the loop when writes finish; results are handled here, on the loop.
+        failed = self.controller.open_all(notify=lambda: self.loop.call_soon_threadsafe(self.drain))
+        for section, error in failed.items():
+            print(f"{section}: not available ({error})")
+        for board in self.pool.open_boards():
+            if not board.state.known: board.read_state()
+        return await asyncio.start_server(self.handle, host, port)
+    def close(self):
+        return self.controller.close(drain=True)
+
+    # --- Board access ---
+    def board(self, key):
+        section = self.controller.find_section(unquote(key))
+        if not section:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown board: {unquote(key)}")
+        try:
+            board = self.pool.get(section) # Reopens lazily (with backoff) after a failure
+        except relayboard.SerialException as e:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, str(e)) from None
+        return section, board
+    def describe(self, section):
+        board = self.pool.boards.get(section)
+        connected = bool(board and board.is_open)
+        state = board.state if board else relayboard.RelayState()
+        return {
+            'board': section,
+            'name': self.config_parser.get(section, 'name', fallback=section),
+            'connected': connected,
+            'known': state.known,
+            'mask': state.mask,
+            'relays': [state.is_on(i) for i in range(protocol.RELAY_COUNT)],
+            'queue_depth': board.queue_depth() if board else 0,
+        }
+    async def apply(self, board, mask, select=relayboard.ALL_RELAYS):
+        done = self.loop.create_future()
+        if not board.apply(mask, select, done):
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, f"Command queue full on {board.name}")
+        try:
+            await asyncio.wait_for(done, WRITE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, f"Write to {board.name} timed out") from None
+        except (relayboard.SerialException, protocol.ProtocolError) as e:
+            raise HTTPError(HTTPStatus.BAD_GATEWAY, f"Write to {board.name} failed: {e}") from None
+    async def apply_section(self, section, mask, select):
+        await self.apply(self.board(section)[1], mask, select)
+    def drain(self):
+        # Completions from every worker: settle the waiting requests, then publish state changes.
+        for section, board in list(self.pool.boards.items()):
+            done = board.completed()
+            while done:
+                on_done, error = done.pop(0)
+                if error and not isinstance(error, protocol.ProtocolError) and board.is_open:
+                    print(f"Communication error on {section}: {error}")
+                    # Closing hands back what was still queued (failed), so those requests get a 502 too.
+                    done.extend(self.pool.mark_failed(section))
+                if isinstance(on_done, asyncio.Future):
+                    if on_done.done(): continue
+                    if error: on_done.set_exception(error)
+                    else: on_done.set_result(None)
+                elif on_done and not error:
+                    on_done()
+        if self.clients: self.publish()
+    def publish(self):
+        for section in self.config_parser.sections():
+            message = self.describe(section)
+            key = (message['connected'], message['known'], message['mask'])
+            if self.last_sent.get(section) == key: continue
+            self.last_sent[section] = key
+            frame = ws_frame(json.dumps(message).encode())
+            for client in self.clients:
+                if client.full(): client.get_nowait() # Slow client: drop its oldest message, keep the newest
+                client.put_nowait(frame)
+
+    # --- Routing ---
+    async def route(self, method, path, body):
+        parts = [p for p in path.split('/') if p]
+        data = json.loads(body) if body.strip() else {}
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        if parts == ['boards'] and method == 'GET':
+            return [self.describe(s) for s in self.config_parser.sections()]
+        if len(parts) == 2 and parts[0] == 'boards' and method == 'GET':
+            section = self.controller.find_section(unquote(parts[1]))
+            if not section: raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown board: {unquote(parts[1])}")
+            return self.describe(section)
+        if len(parts) == 4 and parts[0] == 'boards' and parts[2] == 'relays' and method == 'POST':
+            section, board = self.board(parts[1])
+            relay = parse_int(parts[3], "Relay number")
+            if not 1 <= relay <= protocol.RELAY_COUNT:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Relay number out of range: {relay}")
+            bit = 1 << (relay - 1)
+            on = bool(data['on']) if 'on' in data else not board.state.target_is_on(relay - 1)
+            await self.apply(board, bit if on else 0, bit)
+            return self.describe(section)
+        if len(parts) == 3 and parts[0] == 'boards' and parts[2] == 'mask' and method == 'POST':
+            section, board = self.board(parts[1])
+            if 'mask' not in data: raise HTTPError(HTTPStatus.BAD_REQUEST, "'mask' is required")
+            mask = parse_int(data['mask'], "mask")
+            select = parse_int(data.get('select', relayboard.ALL_RELAYS), "select")
+            await self.apply(board, mask & relayboard.ALL_RELAYS, select & relayboard.ALL_RELAYS)
+            return self.describe(section)
+        if parts == ['metrics'] and method == 'GET':
+            return metrics.to_prometheus(self.pool.metrics_snapshot())
+        if parts == ['metrics.json'] and method == 'GET':
+            return self.pool.metrics_snapshot()
+        if parts == ['scenes'] and method == 'GET':
+            return relayboard.scene_names(self.config_parser)
+        if len(parts) == 2 and parts[0] == 'scenes' and method == 'POST':
+            return await self.run_scene(unquote(parts[1]))
+        if parts and parts[0] in ('boards', 'scenes'):
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not supported on {path}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+    async def run_scene(self, name):
+        try:
+            targets = relayboard.scene_targets(self.config_parser, name)
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, f"Bad scene '{name}' in config: {e}") from None
+        if not targets:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown scene: {name}")
+        # All boards at once; each one's result is reported without failing the others.
+        sections = list(targets)
+        results = await asyncio.gather(*(self.apply_section(s, *targets[s]) for s in sections), return_exceptions=True)
+        return {s: ('ok' if r is None else str(r)) for s, r in zip(sections, results)}
+
+    # --- Connections ---
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                path = urlsplit(target).path
+                if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                    await self.websocket(reader, writer, headers)
+                    return
+                try:
+                    status, payload = HTTPStatus.OK, await self.route(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except (ValueError, KeyError) as e:
+                    status, payload = HTTPStatus.BAD_REQUEST, {'error': f"Bad request: {e}"}
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                if isinstance(payload, str): # Plain text, e.g. /metrics
+                    data, content_type = payload.encode(), 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    data, content_type = json.dumps(payload).encode(), 'application/json'
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: {content_type}\r\n"
+                             f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass # Server shutting down with the connection still open
+        finally:
+            writer.close()
+    async def websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1((headers.get('sec-websocket-key', '') + WS_GUID).encode()).digest()).decode()
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode())
+        outbox = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        for section in self.config_parser.sections(): # Snapshot first, then changes
+            outbox.put_nowait(ws_frame(json.dumps(self.describe(section)).encode()))
+        self.clients.add(outbox)
+        async def send():
+            while True:
+                writer.write(await outbox.get())
+                await writer.drain()
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                opcode, payload = await ws_read(reader)
+                if opcode == 0x8: # Close
+                    writer.write(ws_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9: outbox.put_nowait(ws_frame(payload, 0xA)) # Ping -> pong
+        finally:
+            self.clients.discard(outbox)
+            sender.cancel()
+
+
+async def serve(controller, host, port):
+    server = RelayServer(controller)
+    listener = await server.start(host, port)
+    print(f"Relay API listening on http://{host}:{port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP/WebSocket API for CH340 relay boards.")
+    parser.add_argument('--config', default=relayboard.CONFIG_FILE)
+    parser.add_argument('--host', default=DEFAULT_HOST, help="address to bind (default: %(default)s, local only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    opts = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(relayboard.RelayController(opts.config), opts.host, opts.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# --- Checks for the serial path against the simulated board (python3 -m pytest, or -m unittest) ---
+# Needs pyserial and a pty (Linux/macOS); no hardware, tkinter or Pillow.
+import configparser
+import queue
+import sys
+import threading
+import time
+import types
+import unittest
+import discovery
+import fakeboard
+import hotplug
+import protocol
+import relayboard
+import sequencer
+
+SETTLE_TIMEOUT = 2.0
+
+
+def settle(fake, frames):
+    # Waits until the simulated board has taken in `frames` frames and sent every reply.
+    return fake.wait_until(lambda b: b.frames >= frames and b.idle, SETTLE_TIMEOUT)
+
+
+class ProtocolTests(unittest.TestCase):
+    def test_relay_frames_match_the_documented_bytes(self):
+        self.assertEqual(protocol.relay_frame(0, True), bytes.fromhex('3A 46 45 30 35 30 30 30 30 46 46 30 30 46 45 0D 0A'))
+        self.assertEqual(protocol.relay_frame(0, False), bytes.fromhex('3A 46 45 30 35 30 30 30 30 30 30 30 30 46 44 0D 0A'))
+    def test_decode_round_trip(self):
+        frame = protocol.encode_frame(0x12, protocol.FUNC_WRITE_COILS, b'\x00\x01\x02')
+        self.assertEqual(protocol.decode_frame(frame), (0x12, protocol.FUNC_WRITE_COILS, b'\x00\x01\x02'))
+    def test_bad_lrc_is_rejected(self):
+        frame = bytearray(protocol.relay_frame(3, True))
+        frame[-3] = ord('0') if frame[-3] != ord('0') else ord('1')
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_frame(frame)
+    def test_coil_status(self):
+        reply = protocol.encode_frame(protocol.DEFAULT_ADDRESS, protocol.FUNC_READ_COILS, b'\x02\x05\x80')
+        self.assertEqual(protocol.decode_coil_status(reply), 0x8005)
+
+
+class CommandQueueTests(unittest.TestCase):
+    def test_same_relay_coalesces(self):
+        commands = relayboard.CommandQueue()
+        commands.put('first', 'a', key=3, touches=1 << 3)
+        commands.put('second', 'b', key=3, touches=1 << 3)
+        entry = commands.get()
+        self.assertEqual((entry.command, entry.callbacks, commands.coalesced), ('second', ['a', 'b'], 1))
+        self.assertTrue(commands.empty())
+    def test_no_coalescing_across_a_later_write_to_that_relay(self):
+        commands = relayboard.CommandQueue()
+        commands.put('relay', key=3, touches=1 << 3)
+        commands.put('mask', touches=relayboard.ALL_RELAYS)
+        commands.put('relay again', key=3, touches=1 << 3)
+        self.assertEqual([commands.get().command for _ in range(3)], ['relay', 'mask', 'relay again'])
+    def test_full_queue_refuses(self):
+        commands = relayboard.CommandQueue(maxsize=1)
+        self.assertTrue(commands.put('one'))
+        self.assertFalse(commands.put('two'))
+
+
+class RelayBoardTests(unittest.TestCase):
+    def setUp(self):
+        self.fake = fakeboard.FakeBoard()
+        self.board = relayboard.RelayBoard(self.fake.device, min_gap=0).open()
+    def tearDown(self):
+        self.board.close(drain=False)
+        self.fake.close()
+    def run_to_idle(self):
+        self.assertTrue(self.board.wait_idle(SETTLE_TIMEOUT))
+        self.assertTrue(settle(self.fake, self.board.metrics_snapshot()['frames']))
+    def test_apply_only_sends_what_changed(self):
+        self.board.all_off()
+        self.run_to_idle()
+        self.assertEqual(self.fake.frames, 1) # One multi-coil frame for all 16 relays
+        self.board.set_relay(4, False)
+        self.board.set_relay(4, True)
+        self.board.apply(0x0010, 0x00FF) # Already the target: nothing to send
+        self.run_to_idle()
+        self.assertEqual(self.fake.frames, 2)
+        self.board.apply(0xF0F0)
+        self.run_to_idle()
+        self.assertEqual(self.fake.frames, 3)
+        self.assertEqual((self.fake.mask, self.board.state.mask), (0xF0F0, 0xF0F0))
+    def test_read_state_adopts_the_board(self):
+        self.fake.mask = 0x1234
+        self.board.read_state(block=True)
+        self.run_to_idle()
+        self.assertTrue(self.board.state.known)
+        self.assertEqual(self.board.state.mask, 0x1234)
+    def test_concurrent_apply_keeps_every_change(self):
+        # E.g. the UI toggling relays while a sequence runs on its own thread.
+        self.board.all_off()
+        def flip(first):
+            for n in range(200):
+                relay = first + n % 8
+                self.board.apply((n // 8 % 2 == 0) << relay, 1 << relay | 1 << (first + (n + 3) % 8), block=True)
+        threads = [threading.Thread(target=flip, args=(first,)) for first in (0, 8)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6) # Switch threads as often as possible to provoke the race
+        try:
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.run_to_idle()
+        self.assertEqual(self.board.state.target, self.board.state.mask)
+        self.assertEqual(self.fake.mask, self.board.state.mask)
+    def test_no_op_apply_still_notifies(self):
+        notified = threading.Event()
+        self.board.worker.notify = notified.set
+        self.board.all_off()
+        self.run_to_idle()
+        notified.clear()
+        self.board.apply(0, 0x000F, 'done')
+        self.assertTrue(notified.is_set())
+        self.assertIn(('done', None), self.board.completed())
+    def test_close_fails_dropped_writes(self):
+        started = threading.Event()
+        self.board.submit(lambda: started.set() or time.sleep(0.2), 'slow')
+        self.assertTrue(started.wait(SETTLE_TIMEOUT))
+        for relay in range(4): self.board.set_relay(relay, True, f'relay {relay}')
+        done = dict(self.board.close(drain=False))
+        self.assertIsNone(done['slow'])
+        self.assertTrue(all(isinstance(done[f'relay {relay}'], relayboard.SerialException) for relay in range(4)))
+    def test_unplugged_port_fails_writes_instead_of_stopping_the_worker(self):
+        self.fake.close() # Hangs up the port: flush() and reset_input_buffer() raise termios.error
+        self.assertTrue(self.board.read_state('read'))
+        self.assertTrue(self.board.set_relay(1, True, 'write'))
+        self.assertTrue(self.board.wait_idle(SETTLE_TIMEOUT))
+        done = dict(self.board.completed())
+        self.assertIsInstance(done['read'], relayboard.SerialException)
+        self.assertIsInstance(done['write'], relayboard.SerialException)
+        self.assertTrue(self.board.worker.is_alive())
+
+
+class EchoTests(unittest.TestCase):
+    # At 9600 baud a single-coil echo is still on the wire when the next frame's reply is awaited.
+    def setUp(self):
+        self.fake = fakeboard.FakeBoard(baud=relayboard.BAUD_RATE)
+        self.board = relayboard.RelayBoard(self.fake.device).open()
+    def tearDown(self):
+        self.board.close(drain=False)
+        self.fake.close()
+    def test_bulk_write_after_a_toggle(self):
+        self.board.set_relay(2, True)
+        self.board.apply(0xF0F0)
+        self.assertTrue(self.board.wait_idle(SETTLE_TIMEOUT))
+        self.assertIs(self.board.worker.bulk_supported, True)
+        self.assertEqual([error for _, error in self.board.completed() if error], [])
+        self.assertTrue(settle(self.fake, 2))
+        self.assertEqual(self.fake.mask, 0xF0F0)
+    def test_status_query_after_a_toggle(self):
+        self.board.set_relay(3, True)
+        self.board.read_state()
+        self.board.verify()
+        self.assertTrue(self.board.wait_idle(SETTLE_TIMEOUT))
+        self.assertEqual([error for _, error in self.board.completed() if error], [])
+        self.assertTrue(self.board.state.known)
+        self.assertEqual(self.board.state.mask, 1 << 3)
+        self.assertIsNone(self.board.last_drift)
+    def test_write_queued_during_a_status_query(self):
+        self.fake.mask = 0x10
+        self.board.read_state()
+        self.board.set_relay(0, True) # Queued while the query is on the wire
+        self.assertTrue(self.board.wait_idle(SETTLE_TIMEOUT))
+        state = self.board.state
+        self.assertEqual((state.mask, state.target, state.known), (0x11, 0x11, True))
+        self.assertTrue(self.board.set_relay(4, False))
+        self.assertTrue(self.board.wait_idle(SETTLE_TIMEOUT))
+        self.assertTrue(settle(self.fake, 3))
+        self.assertEqual(self.fake.mask, 0x01)
+
+
+class SequenceTests(unittest.TestCase):
+    def setUp(self):
+        self.fake = fakeboard.FakeBoard()
+        self.board = relayboard.RelayBoard(self.fake.device, min_gap=0).open()
+        self.board.all_off()
+        self.assertTrue(self.board.wait_idle(SETTLE_TIMEOUT))
+    def tearDown(self):
+        self.board.close(drain=False)
+        self.fake.close()
+    def play(self, steps):
+        run = sequencer.SequenceRun(self.board, steps, 'test')
+        run.start()
+        return run
+    def test_parse_step(self):
+        config_parser = configparser.ConfigParser()
+        config_parser.read_string("[b]\nscene_evening = 0x00FF/0x0FFF\n")
+        self.assertEqual(sequencer.parse_step("250 on 1 3"), (0.25, 0b101, 0b101))
+        self.assertEqual(sequencer.parse_step("0 off 16"), (0.0, 0, 0x8000))
+        self.assertEqual(sequencer.parse_step("10 all-on"), (0.01, relayboard.ALL_RELAYS, relayboard.ALL_RELAYS))
+        self.assertEqual(sequencer.parse_step("0 pattern 0x1F0F/0x000F"), (0.0, 0x1F0F, 0x000F))
+        self.assertEqual(sequencer.parse_step("5 scene evening", config_parser, 'b'), (0.005, 0x00FF, 0x0FFF))
+        for text in ("on 1", "10 on", "10 on 17", "10 blink 1", "10 all-off 2", "10 scene missing"):
+            with self.assertRaises(ValueError, msg=text):
+                sequencer.parse_step(text, config_parser, 'b')
+    def test_load_sequence_orders_steps_by_offset(self):
+        config_parser = configparser.ConfigParser()
+        config_parser.read_string("[b]\nsequence_mixed = 500 off 1; 0 on 1; 500 on 2;\n")
+        self.assertEqual(sequencer.load_sequence(config_parser, 'b', 'mixed'), [(0.0, 1, 1), (0.5, 0, 1), (0.5, 2, 2)])
+        with self.assertRaises(ValueError):
+            sequencer.load_sequence(config_parser, 'b', 'other')
+    def test_pulse(self):
+        run = self.play([(0.0, 1 << 3, 1 << 3), (0.2, 0, 1 << 3)])
+        self.assertTrue(self.fake.wait_until(lambda b: b.mask == 1 << 3, SETTLE_TIMEOUT))
+        switched_on = time.monotonic()
+        self.assertTrue(self.fake.wait_until(lambda b: b.mask == 0, SETTLE_TIMEOUT))
+        self.assertGreater(time.monotonic() - switched_on, 0.1)
+        self.assertTrue(run.wait(SETTLE_TIMEOUT))
+        self.assertEqual([offset for offset, _ in run.drift], [0.0, 0.2])
+        self.assertTrue(all(abs(late) < 0.1 for _, late in run.drift))
+        self.assertIn("2/2 steps", run.report())
+    def test_cancel_stops_the_remaining_steps(self):
+        run = self.play([(0.0, 1, 1), (0.3, 2, 2), (0.6, 4, 4)])
+        self.assertTrue(self.fake.wait_until(lambda b: b.mask == 1, SETTLE_TIMEOUT))
+        run.cancel()
+        self.assertTrue(run.wait(SETTLE_TIMEOUT))
+        self.assertTrue(settle(self.fake, self.board.metrics_snapshot()['frames']))
+        self.assertEqual((self.fake.mask, self.board.state.target), (1, 1))
+        self.assertEqual(len(run.drift), 1)
+        self.assertIn("(cancelled)", run.report())
+    def test_refused_step_is_reported(self):
+        self.board.worker.commands.maxsize = 0 # Every write is refused as if the queue were full
+        run = self.play([(0.0, 1, 1)])
+        self.assertTrue(run.wait(SETTLE_TIMEOUT))
+        self.assertEqual(run.drift, [(0.0, None)])
+        self.assertIn("1 refused (queue full)", run.report())
+
+
+class DiscoveryTests(unittest.TestCase):
+    def test_tty_named_section_moves_to_the_board_identity(self):
+        config_parser = configparser.ConfigParser()
+        config_parser.read_string("[usb-path:1-1]\nname = A\n[/dev/ttyUSB0]\nname = Old\n[/dev/ttyUSB1]\nname = Unplugged\n")
+        port = types.SimpleNamespace(device='/dev/ttyUSB0', serial_number=None, vid=0x1A86, pid=0x7523, location='1-1.2:1.0', hwid='USB VID:PID=1A86:7523')
+        index = discovery.DeviceIndex(lambda: [port]).refresh()
+        self.assertEqual(discovery.migrate_sections(config_parser, index), {'/dev/ttyUSB0': 'usb-path:1-1.2:1.0'})
+        self.assertEqual(config_parser.sections(), ['usb-path:1-1', 'usb-path:1-1.2:1.0', '/dev/ttyUSB1'])
+        self.assertEqual(config_parser.get('usb-path:1-1.2:1.0', 'name'), 'Old')
+        self.assertEqual(discovery.migrate_sections(config_parser, index), {})
+
+
+class HotplugTests(unittest.TestCase):
+    def test_events_reach_the_callback(self):
+        source = hotplug.QueueSource()
+        events = queue.SimpleQueue()
+        watcher = hotplug.HotplugWatcher(lambda action, device: events.put((action, device)), source)
+        source.push(hotplug.ADD, '/dev/ttyUSB7')
+        source.push(hotplug.REMOVE, '/dev/ttyUSB7')
+        self.assertEqual(events.get(timeout=SETTLE_TIMEOUT), (hotplug.ADD, '/dev/ttyUSB7'))
+        self.assertEqual(events.get(timeout=SETTLE_TIMEOUT), (hotplug.REMOVE, '/dev/ttyUSB7'))
+        watcher.close(SETTLE_TIMEOUT)
+        self.assertFalse(watcher.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# --- Checks for the HTTP / WebSocket API against simulated boards (python3 -m pytest, or -m unittest) ---
+# Runs server.RelayServer on its own loop through loadtest.start_server; needs pyserial and a pty.
+import asyncio
+import base64
+import configparser
+import json
+import os
+import socket
+import tempfile
+import time
+import unittest
+from urllib.parse import quote
+import fakeboard
+import loadtest
+import relayboard
+import server
+
+REPLY_TIMEOUT = 2.0 # Well under server.WRITE_TIMEOUT, so a request left hanging fails the test
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ServerTests(unittest.TestCase):
+    def setUp(self):
+        self.fakes = {name: fakeboard.FakeBoard() for name in ('Good', 'Dead')}
+        config = configparser.ConfigParser()
+        for name, fake in self.fakes.items():
+            config[fake.device] = {'name': name, 'scene_evening': '0x00FF'}
+        with tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False) as config_file:
+            config.write(config_file)
+        self.config_file = config_file.name
+        self.port = free_port()
+        self.state, self.thread = loadtest.start_server(self.config_file, self.port)
+    def tearDown(self):
+        self.state['loop'].call_soon_threadsafe(self.state['loop'].stop)
+        self.thread.join(5)
+        for fake in self.fakes.values(): fake.close()
+        os.unlink(self.config_file)
+    def requests(self, *requests):
+        # [(method, path, body)] over one keep-alive connection -> [(status, payload)]
+        async def send():
+            reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+            try:
+                return [await asyncio.wait_for(loadtest.http_request(reader, writer, *request), REPLY_TIMEOUT) for request in requests]
+            finally:
+                writer.close()
+        return asyncio.run(send())
+    def test_repeated_write_answers_at_once(self):
+        path = f"/boards/{quote(self.fakes['Good'].device, safe='')}/relays/3"
+        started = time.monotonic()
+        (first, state), (second, _) = self.requests(('POST', path, {'on': True}), ('POST', path, {'on': True}))
+        self.assertEqual((first, second), (200, 200))
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertTrue(state['relays'][2])
+        self.assertTrue(self.fakes['Good'].wait_until(lambda b: b.mask == 1 << 2, REPLY_TIMEOUT))
+    def test_errors(self):
+        (unknown, _), (bad_mask, _), (bad_relay, _), (no_route, _), (wrong_method, _) = self.requests(
+            ('POST', '/boards/nosuch/relays/1', {'on': True}),
+            ('POST', '/boards/Good/mask', {'mask': 'lots'}),
+            ('POST', '/boards/Good/relays/17', {'on': True}),
+            ('GET', '/nowhere', None),
+            ('GET', '/scenes/evening', None))
+        self.assertEqual((unknown, bad_mask, bad_relay, no_route, wrong_method), (404, 400, 400, 404, 405))
+    def test_write_to_a_failed_board(self):
+        # A closed pty disappears (answering 503 before any write), so fail the open port's
+        # writes the way pyserial reports an unplugged adapter instead.
+        def unplugged(data): raise relayboard.SerialException("write failed: [Errno 5] Input/output error")
+        self.state['server'].pool.boards[self.fakes['Dead'].device].serial_port.write = unplugged
+        (status, payload), (retry, _) = self.requests(('POST', '/boards/Dead/relays/1', {'on': True}), ('POST', '/boards/Dead/relays/1', {'on': True}))
+        self.assertEqual((status, retry), (502, 503), payload) # Then backing off before reconnecting
+    def test_scene(self):
+        (status, payload), = self.requests(('POST', '/scenes/evening', None))
+        self.assertEqual((status, payload), (200, {fake.device: 'ok' for fake in self.fakes.values()}))
+    def test_websocket_streams_changes(self):
+        async def watch():
+            reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+            key = base64.b64encode(os.urandom(16)).decode()
+            writer.write(f"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                         f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+            try:
+                while (await reader.readline()) not in (b'\r\n', b''): pass
+                for _ in self.fakes: await asyncio.wait_for(server.ws_read(reader), REPLY_TIMEOUT) # Snapshot
+                await asyncio.to_thread(self.requests, ('POST', '/boards/Good/mask', {'mask': '0x0101'}))
+                while True:
+                    opcode, payload = await asyncio.wait_for(server.ws_read(reader), REPLY_TIMEOUT)
+                    message = json.loads(payload)
+                    if message['name'] == 'Good' and message['mask'] == 0x0101: return message
+            finally:
+                writer.close()
+        self.assertTrue(asyncio.run(watch())['known'])
+
+
+if __name__ == '__main__':
+    unittest.main()